@@ -0,0 +1,190 @@
+"""
+Scenario benchmarks.
+
+Each scenario plays a scripted match through the real GameLoop, drawing
+included (to SDL's dummy display, so no window opens), and times every stage
+of every frame.  The results are written as JSON and, if there is a baseline
+file from an earlier run, compared against it stage by stage.
+
+Usage:
+    python benchmark.py [scenario ...] [--frames N] [--out FILE]
+                        [--baseline FILE] [--save-baseline] [--threshold PCT]
+"""
+
+# python standard library modules
+import argparse
+import json
+import os
+import platform
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')  # must be set before globals is imported
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+# our modules
+from main import *
+
+STAGES = ('handle_players_inputs', 'handle_monsters', 'handle_particles', 'handle_event_queue', 'draw_screen')
+
+
+# ----------------------------------------------------------------------------
+class Scenario:
+    def __init__(self, name, description, p1_pressed=(), setup=None, every_frame=None, arena='arena3'):
+        """setup(game) runs once before the first frame, every_frame(game)
+        before each one; both players have infinite health and energy"""
+        self.name = name
+        self.description = description
+        self.p1_pressed = p1_pressed
+        self.setup = setup
+        self.every_frame = every_frame
+        self.arena = arena
+
+    def run(self, frames):
+        GL.SELECTED_ARENA = Arena(getattr(GL, self.arena))
+        GL.P1_SPRITESHEET = 'data/sprites+portraits/human_p1.png'
+        GL.P2_SPRITESHEET = 'data/sprites+portraits/elf_p2.png'
+        GL.INPUT1, GL.INPUT2 = PackedInput(1), PackedInput(2)
+        GL.INPUT1.P1_ININITE_HEALTH_ENERGY_ON = GL.INPUT1.P2_ININITE_HEALTH_ENERGY_ON = True
+        GL.INPUT1.set_bits(sum(1 << INPUT_FLAGS.index(flag) for flag in self.p1_pressed))
+
+        game = GameLoop(seed=0)
+        if self.setup:
+            self.setup(game)
+        samples = {stage: [] for stage in STAGES + ('frame',)}
+        for stage in STAGES:
+            setattr(game, stage, _timed(getattr(game, stage), samples[stage]))
+
+        stdout, sys.stdout = sys.stdout, open(os.devnull, 'w')  # skills print their sounds
+        try:
+            for _ in range(frames):
+                if self.every_frame:
+                    self.every_frame(game)
+                start = time.perf_counter()
+                game.step()
+                game.draw_screen()
+                samples['frame'].append(time.perf_counter() - start)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+        return {stage: summarize(s) for stage, s in samples.items()}
+
+
+def _timed(f, samples):
+    def _wrapper(*args):
+        start = time.perf_counter()
+        result = f(*args)
+        samples.append(time.perf_counter() - start)
+        return result
+    return _wrapper
+
+
+def summarize(samples):
+    """mean/p95/p99/max of a list of seconds, in milliseconds"""
+    ordered = sorted(samples)
+
+    def _percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000
+    return {'mean_ms': sum(ordered) / len(ordered) * 1000, 'p95_ms': _percentile(95),
+            'p99_ms': _percentile(99), 'max_ms': ordered[-1] * 1000}
+
+
+# ----------------------------------------------------------------------------
+def _setup_bee_hive(game):
+    game.player1.ult_id = 1004
+
+
+def _setup_shrapnel_bomb(game):
+    game.player1.skill1_id = 105
+
+
+def _setup_machine_gun(game):
+    game.player1.attack_id = 110
+
+
+def _setup_monster_horde(game):
+    game.arena.max_monsters = 200
+
+
+def _setup_bee_hive_horde(game):
+    _setup_bee_hive(game)
+    _setup_monster_horde(game)
+
+
+def _setup_epicenter_horde(game):
+    game.player1.ult_id = 1005
+    _setup_monster_horde(game)
+
+
+def _spawn_monster(game):
+    game.spawn_monsters = True  # one per frame instead of one per 10 seconds
+
+
+SCENARIOS = [
+    Scenario('idle', 'nobody presses anything; monsters spawn normally'),
+    Scenario('bee_hive', 'Bee Hive (1004) cast as often as its cooldown allows', ('ULT',), _setup_bee_hive),
+    Scenario('shrapnel_bomb', 'Shrapnel Bomb (105) thrown and detonated over and over', ('SKILL1',), _setup_shrapnel_bomb),
+    Scenario('machine_gun', 'Machine Gun (110) held down; its cooldown is shorter than a frame', ('ATTACK',), _setup_machine_gun),
+    Scenario('monster_horde', 'max_monsters raised to 200, one spawned every frame', (), _setup_monster_horde, _spawn_monster),
+    Scenario('bee_hive_horde', 'bee_hive and monster_horde at once', ('ULT',), _setup_bee_hive_horde, _spawn_monster),
+    Scenario('epicenter_horde', 'Epicenter (1005) cast as often as it can, with monster_horde', ('ULT',), _setup_epicenter_horde, _spawn_monster),
+]
+
+
+# ----------------------------------------------------------------------------
+def compare(results, baseline, threshold):
+    """prints current vs. baseline for every stage; returns the list of
+    (scenario, stage, stat) that got slower by more than threshold percent"""
+    regressions = []
+    print('{:<15} {:<22} {:>24} {:>24} {:>24}'.format('scenario', 'stage', 'mean ms', 'p95 ms', 'p99 ms'))
+    for name, stages in sorted(results['scenarios'].items()):
+        for stage, stats in sorted(stages.items()):
+            old = baseline.get('scenarios', {}).get(name, {}).get(stage)
+            cells = []
+            for stat in ('mean_ms', 'p95_ms', 'p99_ms'):
+                if old is None or not old[stat]:
+                    cells.append('{:>8.3f}'.format(stats[stat]))
+                    continue
+                change = (stats[stat] - old[stat]) / old[stat] * 100
+                cells.append('{:>8.3f} -> {:>8.3f} {:>+5.0f}%'.format(old[stat], stats[stat], change))
+                if change > threshold:
+                    regressions.append((name, stage, stat))
+            print('{:<15} {:<22} {:>24} {:>24} {:>24}'.format(name, stage, *cells))
+    return regressions
+
+
+def run_benchmarks():
+    parser = argparse.ArgumentParser(description='Run the scenario benchmarks.')
+    parser.add_argument('scenarios', nargs='*', help='default: all of ' + ', '.join(s.name for s in SCENARIOS))
+    parser.add_argument('--frames', type=int, default=SIM_FPS * 30)
+    parser.add_argument('--out', default='benchmark_results.json')
+    parser.add_argument('--baseline', default='benchmark_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results to the baseline file')
+    parser.add_argument('--threshold', type=float, default=10, help='percent slower that counts as a regression')
+    args = parser.parse_args()
+
+    chosen = [s for s in SCENARIOS if not args.scenarios or s.name in args.scenarios]
+    results = {'frames': args.frames, 'python': platform.python_version(), 'pygame': pygame.version.ver,
+               'scenarios': {}}
+    for scenario in chosen:
+        print('running {} ({})'.format(scenario.name, scenario.description))
+        results['scenarios'][scenario.name] = scenario.run(args.frames)
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print('{} stats more than {}% slower than the baseline'.format(len(regressions), args.threshold))
+        sys.exit(1)
+
+# ----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    run_benchmarks()
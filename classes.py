@@ -1,5 +1,14 @@
+import array
 import collections
 import copy
+import heapq
+import io
+import itertools
+import json
+import operator
+import pickle
+import struct
+import types
 
 # noinspection PyPep8Naming
 import globals as GL
@@ -19,7 +28,15 @@ class Deque2(collections.deque):
         return self()
 
 # -------------------------------------------------------------------------
+def _new_rect2(cls, rect=(0, 0, 0, 0)):
+    r = pygame.Rect.__new__(cls)
+    pygame.Rect.__init__(r, rect)
+    return r
+
+
 class Rect2(pygame.Rect):
+    RECT_FIELDS = ('x', 'y', 'w', 'h')  # what _pack_fields puts first
+
     def __init__(self, *args, **kargs):
         if args != tuple():
             if isinstance(args[0], pygame.Rect):
@@ -41,10 +58,25 @@ class Rect2(pygame.Rect):
                 except KeyError:
                     pass
         for k, v in kargs.items():
-            try:
-                exec('self.{} = {}'.format(k, repr(v)))
-            except SyntaxError:
-                self.__dict__[k] = v
+            setattr(self, k, v)
+
+    def __reduce__(self):
+        """pygame.Rect pickles as cls(x, y, w, h), which drops our attributes
+        and calls subclass __init__s with the wrong arguments"""
+        return _new_rect2, (self.__class__,), self._pack_fields(self.__dict__, self.__dict__.values())
+
+    def __setstate__(self, fields):
+        self.__dict__.update(self._unpack_fields(fields))
+
+    def _pack_fields(self, names, values):
+        """pack_fields, with the rect itself first"""
+        return pack_fields(self.RECT_FIELDS + tuple(names), tuple(self) + tuple(values))
+
+    def _unpack_fields(self, fields):
+        """unpack_fields, less the rect, which goes straight into self"""
+        d = unpack_fields(fields)
+        pygame.Rect.__init__(self, d.pop('x'), d.pop('y'), d.pop('w'), d.pop('h'))
+        return d
 
     def p_collidelist(self, li):
         """follows same logic as pygame.Rect.collidelist, but customized to
@@ -64,8 +96,139 @@ class Rect2(pygame.Rect):
                 hit_indices.append(i)
         return hit_indices
 
+    def segment_entry(self, x0, y0, x1, y1):
+        """how far along the segment from (x0, y0) to (x1, y1), 0 to 1, it
+        first gets strictly inside this rect (the p_collidelist test), or
+        None if it never does"""
+        enter, leave = float('-inf'), float('inf')
+        for a0, a1, low, high in ((x0, x1, self.left, self.right), (y0, y1, self.top, self.bottom)):
+            d = a1 - a0
+            if d == 0:
+                if not low < a0 < high:
+                    return None
+                continue
+            s0, s1 = (low - a0) / d, (high - a0) / d
+            if s0 > s1:
+                s0, s1 = s1, s0
+            enter, leave = max(enter, s0), min(leave, s1)
+        if enter < leave and leave > 0 and enter < 1:
+            return max(enter, 0.0)
+        return None
+
+# -------------------------------------------------------------------------
+class PlayerSprites:
+    """a player's animation frames, as drawn (facing right) and mirrored
+    (facing left), on one atlas surface, so drawing a frame is one blit and
+    no transform. Frames are numbered like the sprite list this replaced."""
+    def __init__(self, sheet, frames):
+        """frames are rects on sheet, whose black pixels are transparent"""
+        sheet.set_colorkey((0, 0, 0))
+        right = sheet.convert_alpha()
+        left = pygame.transform.flip(right, True, False)
+        w, h = right.get_size()
+        atlas = pygame.Surface((2 * w, h), pygame.SRCALPHA)
+        atlas.blit(right, (0, 0), special_flags=pygame.BLEND_RGBA_MAX)  # onto all zeros: a straight copy
+        atlas.blit(left, (w, 0), special_flags=pygame.BLEND_RGBA_MAX)
+        self.atlas = atlas.convert_alpha()
+        self.right = [pygame.Rect(f) for f in frames]
+        self.left = [pygame.Rect(2 * w - f.right, f.top, f.width, f.height) for f in self.right]
+
+    def blit(self, surface, i, flip, pos):
+        """draws frame i, mirrored if flip, with its topleft at pos"""
+        surface.blit(self.atlas, pos, (self.left if flip else self.right)[i])
+
+# -------------------------------------------------------------------------
+class RotationCache:
+    """particle images turned to one of ROTATION_STEPS angles per revolution,
+    made once and kept until the cache holds more than max_bytes of pixels,
+    when the least recently drawn go first"""
+    def __init__(self, images, steps=ROTATION_STEPS, max_bytes=ROTATION_CACHE_BYTES):
+        """images is sid -> upright, right-facing surface (PARTICLES_TABLE)"""
+        self.images = images
+        self.steps = steps
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.turned = collections.OrderedDict()  # (sid, flip, step) -> surface, least recently drawn first
+
+    def get(self, sid, flip, degrees):
+        """images[sid], mirrored if flip and then turned counterclockwise to
+        the nearest step of degrees"""
+        key = sid, flip, int(round(degrees * self.steps / 360.0)) % self.steps
+        image = self.turned.get(key)
+        if image is None:
+            return self._add(key)
+        self.turned.move_to_end(key)
+        return image
+
+    def _add(self, key):
+        sid, flip, step = key
+        image = self.images[sid]
+        if flip:
+            image = pygame.transform.flip(image, True, False)
+        image = self.turned[key] = pygame.transform.rotate(image, step * 360.0 / self.steps)
+        self.bytes += image.get_width() * image.get_height() * image.get_bytesize()
+        while self.bytes > self.max_bytes and len(self.turned) > 1:
+            _, old = self.turned.popitem(last=False)
+            self.bytes -= old.get_width() * old.get_height() * old.get_bytesize()
+        return image
+
+    def prewarm(self, sids):
+        """makes every angle of every sid that has an image, both ways round"""
+        for sid in sids:
+            if sid in self.images:
+                for flip in (False, True):
+                    for step in range(self.steps):
+                        if (sid, flip, step) not in self.turned:
+                            self._add((sid, flip, step))
+
+# -------------------------------------------------------------------------
+class DirtyRects:
+    """the parts of the screen a frame changed, so only those are pushed to
+    the display. Everything moving is added as it is drawn; what it covered
+    the frame before is pushed too, since the static layer is back there now.
+    HUD regions are added only when what they show has changed."""
+    def __init__(self, screen_rect, max_fraction=DIRTY_AREA_LIMIT):
+        self.max_area = max_fraction * screen_rect.width * screen_rect.height
+        self.rects = []  # drawn this frame
+        self.last = []  # drawn the frame before
+        self.shown = {}  # HUD region name -> (what it shows, its rect)
+        self.everything = True
+
+    def begin(self):
+        """called before a frame is drawn"""
+        self.last, self.rects = self.rects, []
+
+    def add(self, rect):
+        self.rects.append(rect)
+
+    def add_all(self):
+        """the next update pushes the whole screen"""
+        self.everything = True
+
+    def changed(self, name, shown, rect):
+        """adds rect, and wherever region name was the last time, if it shows
+        something other than last time"""
+        old = self.shown.get(name)
+        if old is None or old[0] != shown:
+            self.rects.append(rect)
+            if old is not None:
+                self.rects.append(old[1])
+            self.shown[name] = shown, rect
+
+    def update(self):
+        """pushes the dirty parts to the display; all of it if they add up to
+        more than max_area"""
+        rects = self.rects + self.last
+        if self.everything or sum(r.width * r.height for r in rects) > self.max_area:
+            self.everything = False
+            pygame.display.update()
+        else:
+            pygame.display.update(rects)
+
 # -------------------------------------------------------------------------
 class Player(Rect2):
+    CONDITIONS = (STUN, SLOW, SNARE, DOT, SILENCE, WOUNDED, WEAKENED, SPEED, SHIELD, INVIGORATED, EMPOWERED)
+
     def __init__(self, id, topleft, sprite=None):
         self.id = id  # 1 for player1, 2 for player2
 
@@ -91,8 +254,7 @@ class Player(Rect2):
         # misc.
         self.touching_ground = False  # for jumping
         self.hit_wall_from = None  # for wall jumping
-        self.conditions = {STUN: [], SLOW: [], SNARE: [], DOT: [], SILENCE: [], WOUNDED: [],
-                           WEAKENED: [], SPEED: [], SHIELD: [], INVIGORATED: [], EMPOWERED: []}
+        self.conditions = {c: [] for c in self.CONDITIONS}
 
         # character stats
         self.hit_points = self.hit_points_max = 100
@@ -129,7 +291,8 @@ class Player(Rect2):
         self.facing_direction = RIGHT if self.id == 1 else LEFT
         self.facing_direction_initial = self.facing_direction
         self.attack_cooldown_expired = True
-        self.new_particle = None
+        self.spawns = SpawnBuffer()  # what this player's skills made, until GameLoop takes it in
+        self.scheduler = None  # GameLoop's Scheduler, for cooldown timers
 
         # scrolling text
         self.st_buffer = []
@@ -143,6 +306,12 @@ class Player(Rect2):
         self.attack_state = ONEHAND
         self.attack_frame = 1
 
+    def _end_cooldown(self):
+        self.attack_cooldown_expired = True
+
+    def _tick_pickup(self):
+        self.pickup_time += 1
+
     @property
     def input(self):
         return GL.INPUT1 if self.id == 1 else GL.INPUT2 if self.id == 2 else None
@@ -165,6 +334,18 @@ class Player(Rect2):
     def copy(self):
         return Player(self.left, self.top, self.width, self.height)
 
+    def __reduce__(self):
+        """only the conditions a unit has are kept; most have none"""
+        d = dict(self.__dict__)
+        d['conditions'] = tuple((c, l) for c, l in self.conditions.items() if l)
+        return _new_rect2, (self.__class__,), self._pack_fields(d, d.values())
+
+    def __setstate__(self, fields):
+        d = self._unpack_fields(fields)
+        conditions, d['conditions'] = d['conditions'], {c: [] for c in self.CONDITIONS}
+        d['conditions'].update(conditions)
+        self.__dict__.update(d)
+
     def shield_trigger(self, damage_taken):
         """Handles how shield works
         Call this after any damage is taken"""
@@ -274,7 +455,10 @@ class Player(Rect2):
 
         def _check_for_collisions():
             self.hit_wall_from, self.touching_ground = None, False  # reset every frame
-            for terrain in arena.non_spawn_points:
+            # a collision only ever pushes us out of terrain we overlap, so
+            # nothing more than our own size away can be reached
+            nearby = (self.left - self.width, self.top - self.height, self.width * 3, self.height * 3)
+            for terrain in arena.non_spawn_points_near(nearby):
                 # Check if touching ground
                 if (terrain.left < self.left < terrain.right or terrain.left < self.right < terrain.right) or (self.left < terrain.left < self.right or self.left < terrain.right < self.right):
                     if self.top < terrain.top < self.bottom:
@@ -346,14 +530,17 @@ class Player(Rect2):
                         self.state = RESET
                     self.energy -= SKILLS_TABLE[i]['energy']
 
-                    self.play_sound(SKILLS_TABLE[i]['sound'], i)
+                    if not HEADLESS:
+                        self.play_sound(SKILLS_TABLE[i]['sound'], i)
 
-                    self.new_particle = SKILLS_TABLE[i]['start'](i, self, self.input.UP, self.input.DOWN)
+                    self.spawns.add(SKILLS_TABLE[i]['start'](i, self, self.input.UP, self.input.DOWN))
                     if SKILLS_TABLE[i]['cooldown']:
                         self.attack_cooldown_expired = False
-                        pygame.time.set_timer(TIME_TICK_EVENT + self.id, SKILLS_TABLE[i]['cooldown'])
+                        self.scheduler.schedule(SKILLS_TABLE[i]['cooldown'], self._end_cooldown,
+                                                key=PLAYER1_LOCK_TIMER if self.id == 1 else PLAYER2_LOCK_TIMER)
                     if i == -1:
-                        pygame.time.set_timer(PLAYER2_LOCK_EVENT + self.id, SKILLS_TABLE[-1]['cooldown'])
+                        self.scheduler.schedule(SKILLS_TABLE[-1]['cooldown'], self._tick_pickup,
+                                                key=PLAYER1_PICKUP_TIMER if self.id == 1 else PLAYER2_PICKUP_TIMER)
             # If skill is 0, aka empty, and sitting over a skill
             elif (i == 0 or i == 1) and self.overlapping_skill:
                 if button == ATTACKBUTTON and (0 < self.overlapping_skill.id < 99):
@@ -445,8 +632,7 @@ class Monster(Player):
         self.dmg = info.dmg
         self.exp_value = info.exp_value
 
-        self.has_hit = []
-        self.has_hit_time = []
+        self.hits = HitMemory(2000)
         self.hit_by = {1: False, 2: False}
         self.hit_by_time = {1: 0, 2: 0}
 
@@ -462,10 +648,7 @@ class Monster(Player):
         self._handle_movement(arena_map)
 
     def _handle_last_hit(self, time):
-        for i, v in enumerate(self.has_hit_time):
-            if (v + 2000) <= time:
-                del self.has_hit[i]
-                del self.has_hit_time[i]
+        self.hits.expire(time)
 
         if self.hit_by_time[1] + 2000 <= time:
             self.hit_by[1] = False
@@ -522,15 +705,13 @@ class Monster(Player):
                 self.target = self.p2
 
     def on_hit(self, target, time):
-        if target not in self.has_hit:
+        if target not in self.hits:
             if self.kind != ULTIMATE and not self.hit_by[target.id]:
-                self.has_hit.append(target)
-                self.has_hit_time.append(time)
+                self.hits.add(target, time)
                 handle_damage(target, self.dmg, time)
 
             elif self.kind == ULTIMATE:
-                self.has_hit.append(target)
-                self.has_hit_time.append(time)
+                self.hits.add(target, time)
                 handle_damage(target, self.dmg, time)
 
 # -------------------------------------------------------------------------
@@ -544,9 +725,86 @@ class AI_Input():
     def refresh(self):
         self.RIGHT = self.LEFT = self.JUMP = False
 
+    def __reduce__(self):
+        return _new_ai_input, (self.RIGHT | self.LEFT << 1 | self.JUMP << 2,)
+
+
+def _new_ai_input(bits):
+    ai_input = AI_Input()
+    ai_input.RIGHT, ai_input.LEFT, ai_input.JUMP = bool(bits & 1), bool(bits & 2), bool(bits & 4)
+    return ai_input
+
+# -------------------------------------------------------------------------
+class SpatialHash:
+    """uniform grid broadphase: every item is filed under each cell its rect
+    touches, so a query only looks at items near it. Items are usually list
+    indices, and queries return them sorted, so the first hit is the same
+    one pygame's collidelist would find."""
+    def __init__(self, cell_size=64):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.item_cells = {}
+
+    def _keys(self, rect):
+        cs = self.cell_size
+        left, top, width, height = rect
+        x0, y0 = left // cs, top // cs
+        x1, y1 = (left + max(width, 1) - 1) // cs, (top + max(height, 1) - 1) // cs
+        if x0 == x1 and y0 == y1:
+            return ((x0, y0),)
+        return tuple((x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1))
+
+    def clear(self):
+        self.cells.clear()
+        self.item_cells.clear()
+
+    def insert(self, item, rect):
+        keys = self.item_cells[item] = self._keys(rect)
+        for key in keys:
+            cell = self.cells.get(key)
+            if cell is None:
+                self.cells[key] = [item]
+            else:
+                cell.append(item)
+
+    def remove(self, item):
+        for key in self.item_cells.pop(item):
+            self.cells[key].remove(item)
+
+    def move(self, item, rect):
+        if self.item_cells[item] != self._keys(rect):
+            self.remove(item)
+            self.insert(item, rect)
+
+    def index(self, rects):
+        """refiles everything as rects' list indices"""
+        self.clear()
+        for i, rect in enumerate(rects):
+            self.insert(i, rect)
+
+    def query(self, rect):
+        keys = self._keys(rect)
+        if len(keys) == 1:
+            return sorted(self.cells.get(keys[0], ()))
+        found = set()
+        for key in keys:
+            found.update(self.cells.get(key, ()))
+        return sorted(found)
+
+    def near(self, rect):
+        """query, unsorted, for callers that don't care about the order"""
+        keys = self._keys(rect)
+        if len(keys) == 1:
+            return self.cells.get(keys[0], ())
+        found = set()
+        for key in keys:
+            found.update(self.cells.get(key, ()))
+        return found
+
 # -------------------------------------------------------------------------
 class Arena:
     def __init__(self, arena_info):
+        self.arena_info = arena_info
         self.background = arena_info.background
         self.max_monsters = arena_info.max_monsters
         self.possible_monsters = tuple(MONSTER_TABLE.keys()) if arena_info.possible_monsters == ALL \
@@ -567,14 +825,80 @@ class Arena:
             rect.move_ip((play_area.left, 0))  # to account for play area starting 65 pixels from left
 
         self.play_area_rect = rects[0]
-        self.rects = rects[1:]
+        self.rects = []
+        self.terrain_version = 0  # goes up whenever terrain is added or removed
+        self.terrain_grid = SpatialHash(128)  # rects filed by terrain_seq, which keeps their rects order
+        self.terrain_by_seq = {}
+        self.next_terrain_seq = 0
+        for rect in rects[1:]:
+            self.add_terrain(rect)
         self.dropped_skills = []
 
+    def __getstate__(self):
+        """the terrain lookups are rebuilt from rects instead of being copied"""
+        state = dict(self.__dict__)
+        del state['terrain_grid'], state['terrain_by_seq']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.terrain_grid = SpatialHash(128)
+        self.terrain_by_seq = {}
+        for rect in self.rects:  # in terrain_seq order, like add_terrain filed them
+            self.terrain_by_seq[rect.terrain_seq] = rect
+            self.terrain_grid.insert(rect.terrain_seq, rect)
+
     def __iter__(self):
         # currently only time iteration is used is when the rects are drawn
         for rect in [self.play_area_rect] + self.rects:
             yield rect
 
+    # rects must only change through these two, so terrain_grid keeps up
+    def add_terrain(self, rect):
+        rect.terrain_seq = self.next_terrain_seq
+        self.next_terrain_seq += 1
+        self.terrain_by_seq[rect.terrain_seq] = rect
+        self.terrain_grid.insert(rect.terrain_seq, rect)
+        self.rects.append(rect)
+        self.terrain_version += 1
+
+    def pop_terrain(self, i):
+        rect = self.rects.pop(i)
+        del self.terrain_by_seq[rect.terrain_seq]
+        self.terrain_grid.remove(rect.terrain_seq)
+        self.terrain_version += 1
+        return rect
+
+    def remove_terrain(self, rect):
+        """pop_terrain for rect itself, found by identity: rects can share
+        coordinates, and then compare equal"""
+        return self.pop_terrain(next(i for i, r in enumerate(self.rects) if r is rect))
+
+    def terrain_near(self, rect):
+        """the rects filed in the grid cells rect touches, in rects order"""
+        return [self.terrain_by_seq[seq] for seq in self.terrain_grid.query(rect)]
+
+    def terrain_along(self, x0, y0, x1, y1):
+        """the terrain something moving from (x0, y0) to (x1, y1) runs into
+        first (all of it, if it enters several at once), in no particular
+        order"""
+        left, right, top, bottom = min(x0, x1), max(x0, x1), min(y0, y1), max(y0, y1)
+        hit, first = [], None
+        for seq in self.terrain_grid.near((left, top, right - left + 1, bottom - top + 1)):
+            t = self.terrain_by_seq[seq]
+            if not (t.left < right and left < t.right and t.top < bottom and top < t.bottom):
+                continue  # not even near the segment's bounding box
+            s = t.segment_entry(x0, y0, x1, y1)
+            if s is None or (first is not None and s > first):
+                continue
+            if first is None or s < first:
+                hit, first = [], s
+            hit.append(t)
+        return hit
+
+    def non_spawn_points_near(self, rect):
+        return [t for t in self.terrain_near(rect) if not t.spawn_point and t != self.play_area_rect]
+
     @property
     def spawn_points(self):
         return filter(lambda x: x.spawn_point, self)
@@ -593,55 +917,85 @@ class Arena:
 
 # -------------------------------------------------------------------------
 class Particle(Rect2):
+    """Particles are recycled: remove_particle in main.py hands them back with
+    release(), and the next one of the same class made is the last one freed,
+    re-initialized. The attributes every particle has are slots; anything a
+    skill adds goes in __dict__, which is emptied on reuse."""
+    __slots__ = ('sid', 'cooldown', 'duration', 'color', 'spawn_time', 'expired', 'dmg', 'energy',
+                 'belongs_to', 'conditions', 'on_hit_f', 'on_expire_f', 'on_terrain_f', 'persistent_f',
+                 'special_f', 'motion_slot', 'slot', 'generation')
+    free = []  # every subclass has its own
+    SPEC_SLOTS = ('conditions', 'on_hit_f', 'on_expire_f', 'on_terrain_f', 'persistent_f', 'special_f')  # always sid's
+    spec_values = operator.attrgetter(*SPEC_SLOTS)
+
+    def __new__(cls, *args):
+        if cls.free:
+            p = cls.free.pop()
+            p.__dict__.clear()
+            return p
+        p = super().__new__(cls, *args)
+        p.generation = 0  # counts releases, see ParticleSlots.handle
+        return p
+
     def __init__(self, sid, player):
+        spec = particle_spec(sid)
         self.sid = sid
         self.left = 0
         self.top = 0
-        self.width = SKILLS_TABLE[sid]['width']
-        self.height = SKILLS_TABLE[sid]['height']
-        self.cooldown = SKILLS_TABLE[sid]['cooldown']
-        self.duration = SKILLS_TABLE[sid]['duration']
-        self.color = SKILLS_TABLE[sid]['color']
+        self.width = spec.width
+        self.height = spec.height
+        self.cooldown = spec.cooldown
+        self.duration = spec.duration
+        self.color = spec.color
         self.spawn_time = 0
         self.expired = False
-        self.dmg = SKILLS_TABLE[sid]['dmg']
-        self.energy = SKILLS_TABLE[sid]['energy']
+        self.dmg = spec.dmg
+        self.energy = spec.energy
         self.belongs_to = player
-        self.conditions = []
-        self.on_hit_f = None
-        self.on_expire_f = None
-        self.on_terrain_f = None
-        self.persistent_f = None
-        self.special_f = None
-
-        if 'conditions' in SKILLS_TABLE[sid].keys():
-            for c in SKILLS_TABLE[sid]['conditions']:
-                self.conditions.append(c)
-        if 'on_hit_f' in SKILLS_TABLE[sid].keys():
-            self.on_hit_f = SKILLS_TABLE[sid]['on_hit_f']
-        if 'on_expire_f' in SKILLS_TABLE[sid].keys():
-            self.on_expire_f = SKILLS_TABLE[sid]['on_expire_f']
-        if 'on_terrain_f' in SKILLS_TABLE[sid].keys():
-            self.on_terrain_f = SKILLS_TABLE[sid]['on_terrain_f']
-        if 'persistent_f' in SKILLS_TABLE[sid].keys():
-            self.persistent_f = SKILLS_TABLE[sid]['persistent_f']
-        if 'special_path' in SKILLS_TABLE[sid].keys():
-            self.special_f = SKILLS_TABLE[sid]['special_path']
+        self.conditions = spec.conditions
+        self.on_hit_f = spec.on_hit_f
+        self.on_expire_f = spec.on_expire_f
+        self.on_terrain_f = spec.on_terrain_f
+        self.persistent_f = spec.persistent_f
+        self.special_f = spec.special_f
+        self.motion_slot = None  # set while a RangeMotion moves this particle
+        self.slot = None  # set while in a ParticleSlots
+
+    def release(self):
+        """only once nothing holds on to it any more, except by handle"""
+        self.belongs_to = None
+        self.generation += 1
+        type(self).free.append(self)
+
+    def __reduce__(self):
+        """SPEC_SLOTS are left out and looked up again from sid"""
+        names, getter = slot_fields(type(self), self.SPEC_SLOTS)
+        return _new_rect2, (self.__class__,), self._pack_fields(names + tuple(self.__dict__),
+                                                                 getter(self) + tuple(self.__dict__.values()))
+
+    def __setstate__(self, fields):
+        d = self._unpack_fields(fields)
+        d.update(zip(self.SPEC_SLOTS, self.spec_values(particle_spec(d['sid']))))
+        for name, value in d.items():
+            setattr(self, name, value)
 
 # -------------------------------------------------------------------------
 class MeleeParticle(Particle):
+    __slots__ = ('arc', 'progress', 'radius', 'max_radius', 'hits', 'extend', 'dradius', 'direction')
+    free = []
+
     def __init__(self, sid, player):
         # super().__init__(particle.width, particle.height, particle.radius, particle.cooldown, particle.duration, particle.color)
         super().__init__(sid, player)
-        self.arc = self.progress = SKILLS_TABLE[sid]['arc']
-        self.radius = SKILLS_TABLE[sid]['start_radius']
-        self.max_radius = SKILLS_TABLE[sid]['max_radius']
-        self.has_hit = []  # Need this to keep track of what it has hit;
+        spec = particle_spec(sid)
+        self.arc = self.progress = spec.arc
+        self.radius = spec.start_radius
+        self.max_radius = spec.max_radius
+        self.hits = HitMemory(1000)  # Need this to keep track of what it has hit;
         # melee particles are not deleted upon hitting a target, so we need
         # to know who it has hit to prevent the same target being hit
         # multiple times
-        self.has_hit_time = []
-        self.extend = SKILLS_TABLE[sid]['extend']
+        self.extend = spec.extend
         self.dradius = (self.max_radius - self.radius) * 35 / self.duration
         self.direction = player.facing_direction
 
@@ -653,10 +1007,7 @@ class MeleeParticle(Particle):
         if self.spawn_time == 0:
             self.spawn_time = time
 
-        for i, v in enumerate(self.has_hit_time):
-            if (v + 1000) <= time:
-                del self.has_hit[i]
-                del self.has_hit_time[i]
+        self.hits.expire(time)
 
         elapsed_time = time - self.spawn_time
         self.expired = (elapsed_time >= self.duration)
@@ -683,9 +1034,8 @@ class MeleeParticle(Particle):
             self.persistent_f(self, time)
 
     def on_hit(self, target, time):  # DON'T delete time; will use later
-        if target != self.belongs_to and target not in self.has_hit:
-            self.has_hit.append(target)
-            self.has_hit_time.append(time)
+        if target != self.belongs_to and target not in self.hits:
+            self.hits.add(target, time)
 
             handle_damage(target, self.dmg, time)
 
@@ -705,23 +1055,27 @@ class MeleeParticle(Particle):
 
 # -------------------------------------------------------------------------
 class RangeParticle(Particle):
+    __slots__ = ('has_special', 'direction', 'originx', 'originy', 'dx', 'dy', 'ddx', 'ddy', 'prev_center')
+    free = []
+
     def __init__(self, sid, player, up, down):
         super().__init__(sid, player)
+        spec = particle_spec(sid)
         self.has_special = False
         self.direction = player.facing_direction
         self.originx = player.centerx  # Where the particle started
         self.originy = player.centery  # These might be useful later on
         # If has special path, upload function to special_f
-        self.dx = SKILLS_TABLE[sid]['speed']
-        self.ddx = SKILLS_TABLE[sid]['acceleration']
+        self.dx = spec.speed
+        self.ddx = spec.acceleration
 
         # if player pressed up
         if up:
-            self.dy = SKILLS_TABLE[sid]['speed'] * -1
-            self.ddy = SKILLS_TABLE[sid]['acceleration'] * -1
+            self.dy = spec.speed * -1
+            self.ddy = spec.acceleration * -1
         elif down:
-            self.dy = SKILLS_TABLE[sid]['speed']
-            self.ddy = SKILLS_TABLE[sid]['acceleration']
+            self.dy = spec.speed
+            self.ddy = spec.acceleration
         elif not up and not down:
             self.dy = 0
             self.ddy = 0
@@ -739,10 +1093,12 @@ class RangeParticle(Particle):
             self.centerx += 30
             self.dx *= -1
             self.ddx *= -1
+        self.prev_center = self.center  # where it was before its last move; terrain checks sweep from here
 
     def update(self, time):
         if self.spawn_time == 0:
             self.spawn_time = time
+        self.prev_center = self.center
 
         elapsed_time = time - self.spawn_time
         self.expired = (elapsed_time >= self.duration)
@@ -777,36 +1133,360 @@ class RangeParticle(Particle):
             if self.on_hit_f:
                 self.on_hit_f(self, target, time)
 
+# -------------------------------------------------------------------------
+class ParticleSlots:
+    """the active particles, in the order they were added. remove() only
+    blanks the particle's slot, so it takes constant time and a loop that
+    removes particles as it goes never skips the next one; compact()
+    squeezes the blanks out once no loop is running."""
+    def __init__(self):
+        self.items = []  # particles and None's; p.slot is p's index
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        # a list iterator also picks up particles appended during the loop
+        return (p for p in self.items if p is not None)
+
+    def append(self, p):
+        p.slot = len(self.items)
+        self.items.append(p)
+        self.count += 1
+
+    def remove(self, p):
+        self.items[p.slot] = None
+        p.slot = None
+        self.count -= 1
+
+    def compact(self):
+        if self.count < len(self.items):
+            self.items = [p for p in self.items if p is not None]
+            for i, p in enumerate(self.items):
+                p.slot = i
+
+    # released particles get reused, so hold on to one from frame to frame
+    # by handle and get() it back, which is None once it has been released
+    @staticmethod
+    def handle(p):
+        return p, p.generation
+
+    @staticmethod
+    def get(handle):
+        p, generation = handle
+        return p if p.generation == generation else None
+
+# -------------------------------------------------------------------------
+class SpawnBuffer(list):
+    """particles and terrain_nt's a player's skills made, waiting to enter the
+    game. Anything can add to it; GameLoop flushes it once a frame."""
+    def add(self, spawned):
+        """takes whatever a skill's start function returns: None, a Particle,
+        a terrain_nt or a list of them"""
+        if isinstance(spawned, list):
+            self.extend(spawned)
+        elif spawned is not None:
+            self.append(spawned)
+
+    def flush(self, add_particle, arena):
+        """hands every particle to add_particle and every terrain_nt to
+        arena, in the order they were made, and empties the buffer"""
+        for s in self:
+            if isinstance(s, Particle):
+                add_particle(s)
+            else:
+                arena.add_terrain(Rect2(tuple(s)[0:4], color=s.color, hits_to_destroy=s.hits_to_destroy, spawn_point=s.spawn_point))
+        del self[:]
+
+# -------------------------------------------------------------------------
+class ParticleBudget:
+    """keeps the number of live particles bounded. Every particle belongs to
+    a category of PARTICLE_BUDGETS, with a cap and a priority. A particle
+    that would go over its category's cap, or over PARTICLE_LIMIT when it
+    isn't of the highest priority, is thinned instead: a swarm particle is
+    folded into the newest one like it (which takes its damage and grows to
+    stand for both, up to SWARM_MERGE_LIMIT of them), anything else is
+    dropped. counters says how often."""
+    def __init__(self):
+        self.live = dict.fromkeys(PARTICLE_BUDGETS, 0)
+        self.total = 0
+        self.top_priority = max(priority for cap, priority in PARTICLE_BUDGETS.values())
+        self.newest = {}  # (sid, player id) -> ParticleSlots.handle of the last swarm particle let in
+        self.counters = collections.Counter()
+
+    @staticmethod
+    def category(p):
+        return particle_spec(p.sid).category
+
+    def admit(self, p):
+        """counts p in and returns True, or thins it and returns False; the
+        caller then releases p"""
+        category = self.category(p)
+        cap, priority = PARTICLE_BUDGETS[category]
+        if (cap is None or self.live[category] < cap) and (self.total < PARTICLE_LIMIT or priority == self.top_priority):
+            self.live[category] += 1
+            self.total += 1
+            if category == 'swarm':
+                self.newest[(p.sid, p.belongs_to.id)] = ParticleSlots.handle(p)
+            return True
+
+        into = None
+        if category == 'swarm':
+            into = ParticleSlots.get(self.newest.get((p.sid, p.belongs_to.id), (p, -1)))
+        if into is None or into.expired:
+            self.counters['dropped'] += 1
+            return False
+        # merging only saves work, so it mustn't make a stronger swarm: the
+        # merged particle stops at SWARM_MERGE_LIMIT times the skill's own
+        spec = particle_spec(p.sid)
+        if into.dmg + p.dmg > SWARM_MERGE_LIMIT * spec.dmg:
+            self.counters['dropped'] += 1
+            return False
+        into.dmg += p.dmg
+        into.inflate_ip(min(p.width // 2, SWARM_MERGE_LIMIT * spec.width - into.width),
+                        min(p.height // 2, SWARM_MERGE_LIMIT * spec.height - into.height))
+        self.counters['merged'] += 1
+        return False
+
+    def remove(self, p):
+        self.live[self.category(p)] -= 1
+        self.total -= 1
+
+# -------------------------------------------------------------------------
+# Path kinds for SKILLS_TABLE[...]['special_path'], in place of functions.
+# A path is a namedtuple of plain numbers, so it pickles by value, and is
+# called like a path function: path(particle, time) -> new center. Range
+# particles on the same kind of path are updated together by update_all.
+class Path:
+    __slots__ = ()
+
+    def __bool__(self):
+        return True  # even with no fields; `if p.special_f` must still see it
+
+    @classmethod
+    def update_all(cls, particles, time):
+        """RangeParticle.update for particles all on this kind of path"""
+        for p in particles:
+            if p.spawn_time == 0:
+                p.spawn_time = time
+            p.expired = (time - p.spawn_time >= p.duration)
+            p.prev_center = p.center
+        cls.move_all(particles, time)
+        for p in particles:
+            if p.persistent_f:
+                p.persistent_f(p, time)
+
+    @classmethod
+    def move_all(cls, particles, time):
+        for p in particles:
+            p.center = p.special_f(p, time)
+
+
+class OffsetPath(Path, collections.namedtuple('OffsetPath', 'dx, dy')):
+    """the same step every frame"""
+    __slots__ = ()
+
+    def __call__(self, p, time):
+        return p.centerx + self.dx, p.centery + self.dy
+
+    @classmethod
+    def move_all(cls, particles, time):
+        for p in particles:
+            path = p.special_f
+            p.center = p.centerx + path.dx, p.centery + path.dy
+
+
+class VelocityPath(Path, collections.namedtuple('VelocityPath', '')):
+    """a step of the particle's own dx, dy every frame"""
+    __slots__ = ()
+
+    def __call__(self, p, time):
+        return p.centerx + p.dx, p.centery + p.dy
+
+    @classmethod
+    def move_all(cls, particles, time):
+        for p in particles:
+            p.center = p.centerx + p.dx, p.centery + p.dy
+
+
+class AcceleratingPath(Path, collections.namedtuple('AcceleratingPath', '')):
+    """horizontal, dx growing by ddx every frame"""
+    __slots__ = ()
+
+    def __call__(self, p, time):
+        x = p.centerx + p.dx
+        p.dx += p.ddx
+        return x, p.centery
+
+    @classmethod
+    def move_all(cls, particles, time):
+        for p in particles:
+            p.centerx += p.dx
+            p.dx += p.ddx
+
+
+class LobPath(Path, collections.namedtuple('LobPath', '')):
+    """thrown: dx stays, dy grows by ddy every frame"""
+    __slots__ = ()
+
+    def __call__(self, p, time):
+        x = p.centerx + p.dx
+        p.dy += p.ddy
+        return x, p.centery + p.dy
+
+    @classmethod
+    def move_all(cls, particles, time):
+        for p in particles:
+            p.dy += p.ddy
+            p.center = p.centerx + p.dx, p.centery + p.dy
+
+
+class WavePath(Path, collections.namedtuple('WavePath', 'step, amplitude, wavelength, wave')):
+    """step forward every frame, y = originy + amplitude * cos or sin(x / wavelength)"""
+    __slots__ = ()
+
+    def __call__(self, p, time):
+        x = p.centerx + (self.step if p.direction == RIGHT else -self.step)
+        return x, p.originy + self.amplitude * getattr(math, self.wave)(x / self.wavelength)
+
+
+class OwnerPath(Path, collections.namedtuple('OwnerPath', 'dx, dy')):
+    """stuck to the topleft of whoever made the particle"""
+    __slots__ = ()
+
+    def __call__(self, p, time):
+        return p.belongs_to.left + self.dx, p.belongs_to.top + self.dy
+
+# -------------------------------------------------------------------------
+class RangeMotion:
+    """structure-of-arrays store for RangeParticles on the default path (no
+    special_f or persistent_f): their velocities, accelerations, spawn times
+    and durations live in numpy columns, so step() moves and expires all of
+    them at once. Positions stay in the particles' rects, so they round the
+    way pygame does. The particles' own attributes are kept current too, so
+    skill functions can read them and small batches can use update()."""
+    COLUMNS = ('dx', 'dy', 'ddx', 'ddy', 'spawn_time', 'duration')
+
+    def __init__(self, capacity=64):
+        self.particles = []  # slot -> particle; p.motion_slot is the way back
+        self.data = numpy.zeros((len(self.COLUMNS), capacity))
+        self.stale = False  # dx/dy/spawn_time columns behind the particles' own
+
+    @staticmethod
+    def wants(p):
+        return isinstance(p, RangeParticle) and not p.special_f and not p.persistent_f
+
+    def __len__(self):
+        return len(self.particles)
+
+    def add(self, p):
+        slot = len(self.particles)
+        if slot == self.data.shape[1]:
+            self.data = numpy.concatenate((self.data, numpy.zeros_like(self.data)), axis=1)
+        self.data[:, slot] = [getattr(p, c) for c in self.COLUMNS]
+        p.motion_slot = slot
+        self.particles.append(p)
+
+    def remove(self, p):
+        """moves the last particle into p's slot"""
+        slot, last = p.motion_slot, self.particles.pop()
+        if last is not p:
+            self.data[:, slot] = self.data[:, len(self.particles)]
+            self.particles[slot] = last
+            last.motion_slot = slot
+        p.motion_slot = None
+
+    def step(self, time, particles):
+        """what RangeParticle.update does, for every one of particles (all in
+        this store)"""
+        if len(particles) < RANGE_BATCH_MIN:  # numpy's overhead isn't worth it yet
+            for p in particles:
+                p.update(time)
+            self.stale = True
+            return
+        if self.stale:
+            n = len(self.particles)
+            for c in ('dx', 'dy', 'spawn_time'):
+                self.data[self.COLUMNS.index(c), :n] = numpy.fromiter(map(operator.attrgetter(c), self.particles), float, n)
+            self.stale = False
+
+        slots = numpy.fromiter((p.motion_slot for p in particles), int, len(particles))
+        block = self.data[:, slots]
+        dx, dy, ddx, ddy, spawn_time, duration = block
+        new = numpy.flatnonzero(spawn_time == 0)
+        spawn_time[new] = time
+        expired = numpy.flatnonzero((time - spawn_time) >= duration)
+        accelerating = numpy.flatnonzero((ddx != 0) | (ddy != 0))
+        dx += ddx
+        dy += ddy
+        self.data[:, slots] = block
+
+        x = numpy.fromiter(map(operator.attrgetter('centerx'), particles), float, len(particles)) + dx
+        y = numpy.fromiter(map(operator.attrgetter('centery'), particles), float, len(particles)) + dy
+        for p, center in zip(particles, zip(x.tolist(), y.tolist())):
+            p.prev_center = p.center
+            p.center = center
+        # everything else only changes for some of them; dx and dy the way
+        # update() changes them, so an int speed stays an int (the columns
+        # are all floats, and snapshots and digests can tell 7 from 7.0)
+        for i in accelerating.tolist():
+            p = particles[i]
+            p.dx += p.ddx
+            p.dy += p.ddy
+        for i in expired.tolist():
+            particles[i].expired = True
+        for i in new.tolist():
+            particles[i].spawn_time = time
+
+# -------------------------------------------------------------------------
+class MonsterCenters:
+    """the monsters' centers as numpy columns, so a FieldParticle finds every
+    monster inside its radius with one squared-distance test. Filled the
+    first time a field needs it in a frame; move() keeps it up to date when
+    a hit pushes a monster."""
+    def __init__(self):
+        self.x = self.y = None
+
+    def index(self, monsters):
+        n = len(monsters)
+        self.x = numpy.fromiter(map(operator.attrgetter('centerx'), monsters), float, n)
+        self.y = numpy.fromiter(map(operator.attrgetter('centery'), monsters), float, n)
+
+    def move(self, i, monster):
+        self.x[i], self.y[i] = monster.center
+
+    def inside(self, field):
+        """indices of the monsters FieldParticle.is_in_field would pass, in order"""
+        dx = self.x - field.centerx
+        dy = self.y - field.centery
+        return numpy.flatnonzero(dx * dx + dy * dy <= field.radius * field.radius).tolist()
+
 # -------------------------------------------------------------------------
 class FieldParticle(Particle):
+    __slots__ = ('radius', 'frequency', 'persistent_pulse_f', 'originx', 'originy', 'hits')
+    free = []
+
     def __init__(self, sid, player):
         super().__init__(sid, player)
-        self.radius = SKILLS_TABLE[sid]['radius']
-        self.frequency = None
-        self.persistent_pulse_f = None  # (particle, time, target)
+        spec = particle_spec(sid)
+        self.radius = spec.radius
+        self.frequency = spec.frequency
+        self.persistent_pulse_f = spec.persistent_pulse_f  # (particle, time, target)
 
         self.originx = self.centerx = player.centerx
         self.originy = self.centery = player.centery
 
-        self.has_hit = []  # Need this to keep track of what it has hit;
+        self.hits = HitMemory(200)  # Need this to keep track of what it has hit;
         # melee particles are not deleted upon hitting a target, so we need
         # to know who it has hit to prevent the same target being hit
         # multiple times
-        self.has_hit_time = []
-
-        if 'persistent_pulse_f' in SKILLS_TABLE[sid].keys():
-            self.persistent_pulse_f = SKILLS_TABLE[sid]['persistent_pulse_f']
-        if 'frequency' in SKILLS_TABLE[sid].keys():
-            self.frequency = SKILLS_TABLE[sid]['frequency']
 
     def update(self, time):
         if self.spawn_time == 0:
             self.spawn_time = time
 
-        for i, v in enumerate(self.has_hit_time):
-            if (v + 200) <= time:
-                del self.has_hit[i]
-                del self.has_hit_time[i]
+        self.hits.expire(time)
 
         elapsed_time = time - self.spawn_time
         self.expired = (elapsed_time >= self.duration)
@@ -815,13 +1495,14 @@ class FieldParticle(Particle):
             self.persistent_f(self, time)
 
     def is_in_field(self, target):
-        return target.distance_from(self) <= self.radius
+        dx = target.centerx - self.centerx
+        dy = target.centery - self.centery
+        return dx * dx + dy * dy <= self.radius * self.radius
 
     def on_hit(self, target, time):
         # If pulse function exists
-        if target != self.belongs_to and self.frequency and target not in self.has_hit:
-            self.has_hit.append(target)
-            self.has_hit_time.append(time)
+        if target != self.belongs_to and self.frequency and target not in self.hits:
+            self.hits.add(target, time)
             # On pulse
             if (time - self.spawn_time) % self.frequency == 0:
                 handle_damage(target, self.dmg, time)
@@ -841,6 +1522,349 @@ class FieldParticle(Particle):
         if target != self.belongs_to and self.persistent_pulse_f:
             self.peristent_pulse_f(self, target, time)
 
+# -------------------------------------------------------------------------
+class Scheduler:
+    """timed callbacks on simulated time, replacing pygame.time.set_timer so
+    timers fire on the same sim step no matter how fast frames are drawn"""
+    def __init__(self):
+        self.steps = 0  # sim steps run
+        self.now = 0  # simulated msec, whole: derived from steps so it doesn't drift
+        self.queue = []  # heap of [due, seq, key, callback, interval]
+        self.keys = {}  # key -> queue entry
+        self.seq = 0  # tie breaker, so equal due times run in scheduling order
+
+    def schedule(self, delay, callback, key=None):
+        """calls callback once, delay msec from now; re-using a key replaces
+        the pending timer like set_timer does"""
+        return self._push(self.now + delay, callback, key, None)
+
+    def schedule_every(self, interval, callback, key=None, delay=None):
+        """calls callback every interval msec; first call after delay
+        (default interval)"""
+        return self._push(self.now + (interval if delay is None else delay), callback, key, interval)
+
+    def cancel(self, key):
+        entry = self.keys.pop(key, None)
+        if entry is not None:
+            entry[3] = None  # left in the heap, skipped when popped
+
+    def _push(self, due, callback, key, interval):
+        if key is not None:
+            self.cancel(key)
+        self.seq += 1
+        entry = [due, self.seq, key, callback, interval]
+        heapq.heappush(self.queue, entry)
+        if key is not None:
+            self.keys[key] = entry
+        return entry
+
+    def advance(self):
+        """moves time forward one sim step and runs every callback that came
+        due, in (due time, scheduling order); a timer due exactly on a step
+        runs on that step"""
+        self.steps += 1
+        self.now = self.steps * 1000 // SIM_FPS
+        while self.queue and self.queue[0][0] <= self.now:
+            entry = heapq.heappop(self.queue)
+            due, _, key, callback, interval = entry
+            if callback is None:
+                continue
+            if interval is not None:
+                self.seq += 1
+                entry[0] = due + interval
+                entry[1] = self.seq
+                heapq.heappush(self.queue, entry)
+            elif key is not None:
+                del self.keys[key]
+            callback()
+
+
+class HitMemory:
+    """the targets one source (a melee or field particle, a monster) has hit
+    in the last memory msec, so it doesn't hit them again before then.
+    Targets are told apart by identity, not by where their rects are, and
+    forgetting old hits pops them off a heap instead of scanning them all."""
+    def __init__(self, memory):
+        self.memory = memory
+        self.until = {}  # id(target) -> msec it may be hit again
+        self.heap = []  # of (until, seq, target)
+        self.seq = 0  # tie breaker, so targets themselves are never compared
+
+    def __contains__(self, target):
+        return id(target) in self.until
+
+    def add(self, target, time):
+        """remembers a hit on a target that isn't in here yet"""
+        self.seq += 1
+        until = self.until[id(target)] = time + self.memory
+        heapq.heappush(self.heap, (until, self.seq, target))
+
+    def expire(self, time):
+        """forgets every hit at least memory msec old"""
+        heap = self.heap
+        while heap and heap[0][0] <= time:
+            del self.until[id(heapq.heappop(heap)[2])]
+
+    def __reduce__(self):
+        """ids aren't the same in a copy (see GameLoop.snapshot), so the
+        lookup is rebuilt from the heap"""
+        return HitMemory, (self.memory,), (self.heap, self.seq)
+
+    def __setstate__(self, state):
+        self.heap, self.seq = state
+        self.until = {id(target): until for until, _, target in self.heap}
+
+# -------------------------------------------------------------------------
+# every pressed flag a player can hold down (see Input._combine_all_pressed);
+# a flag's index is its bit in a packed input frame
+INPUT_FLAGS = ('LEFT', 'RIGHT', 'UP', 'DOWN', 'JUMP', 'ATTACK',
+               'SKILL1', 'SKILL2', 'SKILL3', 'ULT', 'DROP_SKILL')
+
+
+def pack_input(inp):
+    bits = 0
+    for i, flag in enumerate(INPUT_FLAGS):
+        if getattr(inp, flag):
+            bits |= 1 << i
+    return bits
+
+
+def unpack_input(bits):
+    return [flag for i, flag in enumerate(INPUT_FLAGS) if bits & (1 << i)]
+
+
+class PackedInput:
+    """stands in for an Input whose pressed flags come from packed frames
+    (see pack_input) instead of this machine's keyboard or gamepad"""
+    EVENT_FLAGS = ('LEFT_EVENT', 'RIGHT_EVENT', 'UP_EVENT', 'DOWN_EVENT', 'CONFIRM', 'CANCEL',
+                   'RESPAWN_CHEAT', 'KILLALL_CHEAT', 'QUICK_START', 'PAUSE_MODE_TOGGLED', 'DEBUG_MODE_TOGGLED',
+                   'NEW_P1_RED_SKILL_CHEAT', 'NEW_P1_BLUE1_SKILL_CHEAT', 'NEW_P1_BLUE2_SKILL_CHEAT',
+                   'NEW_P1_BLUE3_SKILL_CHEAT', 'NEW_P1_YELLOW_SKILL_CHEAT',
+                   'NEW_P2_RED_SKILL_CHEAT', 'NEW_P2_BLUE1_SKILL_CHEAT', 'NEW_P2_BLUE2_SKILL_CHEAT',
+                   'NEW_P2_BLUE3_SKILL_CHEAT', 'NEW_P2_YELLOW_SKILL_CHEAT')
+
+    def __init__(self, player_id):
+        self.player_id = player_id
+        self.DEBUG_MODE_ON = self.PAUSE_MODE_ON = False
+        self.P1_ININITE_HEALTH_ENERGY_ON = self.P2_ININITE_HEALTH_ENERGY_ON = False
+        self.set_bits(0)
+        self.refresh()
+
+    def set_bits(self, bits):
+        for i, flag in enumerate(INPUT_FLAGS):
+            setattr(self, flag, bool(bits & (1 << i)))
+
+    def refresh(self):
+        """pressed flags stay as set_bits left them; no menus or cheats"""
+        for name in self.EVENT_FLAGS:
+            setattr(self, name, False)
+
+
+class InputRecording:
+    """one match's inputs: a small header (RNG seed, arena, starting
+    loadouts) and one packed 16 bit frame per player per sim step.
+    Cheat keys are not recorded, so a match that used them won't replay."""
+    MAGIC = b'FAMREC1\n'
+    ARENA_NAMES = ('arena1', 'arena2', 'arena3', 'arena4', 'arena5')
+
+    def __init__(self, seed, arena_name, p1_skills=None, p2_skills=None):
+        self.seed = seed
+        self.arena_name = arena_name
+        self.p1_skills = p1_skills
+        self.p2_skills = p2_skills
+        self.digest = None  # GameLoop.state_digest() after the last frame
+        self.frames = array.array('H')  # p1, p2, p1, p2, ...
+
+    @classmethod
+    def for_game(cls, game):
+        names = [name for name in cls.ARENA_NAMES if getattr(GL, name) is game.arena.arena_info]
+        return cls(game.seed, names[0] if names else None)
+
+    @property
+    def arena_info(self):
+        return getattr(GL, self.arena_name)
+
+    def __len__(self):
+        return len(self.frames) // 2
+
+    def __getitem__(self, step):
+        return self.frames[2 * step], self.frames[2 * step + 1]
+
+    def record(self, player1, player2):
+        if not self.frames:  # loadouts as of the first step
+            self.p1_skills = [player1.attack_id, player1.skill1_id, player1.skill2_id, player1.skill3_id, player1.ult_id]
+            self.p2_skills = [player2.attack_id, player2.skill1_id, player2.skill2_id, player2.skill3_id, player2.ult_id]
+        self.frames.append(pack_input(player1.input))
+        self.frames.append(pack_input(player2.input))
+
+    def save(self, path):
+        header = json.dumps({'seed': self.seed, 'arena': self.arena_name, 'p1_skills': self.p1_skills,
+                             'p2_skills': self.p2_skills, 'steps': len(self), 'digest': self.digest}).encode()
+        frames = self.frames
+        if sys.byteorder != 'little':
+            frames = array.array('H', frames)
+            frames.byteswap()
+        with open(path, 'wb') as f:
+            f.write(self.MAGIC)
+            f.write(struct.pack('<I', len(header)))
+            f.write(header)
+            f.write(frames.tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            if f.read(len(cls.MAGIC)) != cls.MAGIC:
+                raise ValueError('{} is not an input recording'.format(path))
+            header = json.loads(f.read(struct.unpack('<I', f.read(4))[0]).decode())
+            data = f.read()
+        recording = cls(header['seed'], header['arena'], header['p1_skills'], header['p2_skills'])
+        recording.digest = header['digest']
+        recording.frames.frombytes(data)
+        if sys.byteorder != 'little':
+            recording.frames.byteswap()
+        return recording
+
+# -------------------------------------------------------------------------
+class SnapshotRefs:
+    """things a snapshot points to instead of copying: code, images, and
+    whatever else is fixed for the whole match. Only the SnapshotRefs that
+    took a snapshot can restore it. Shared objects can't be ints, strs,
+    tuples, lists or dicts (subclasses are fine): those are always copied."""
+    SHARED_TYPES = {types.FunctionType, types.BuiltinFunctionType, pygame.Surface, pygame.Color}
+
+    def __init__(self, shared=()):
+        self.objects = []
+        self.ids = {}
+        for obj in shared:
+            self.add(obj)
+
+    def add(self, obj):
+        i = self.ids.get(id(obj))
+        if i is None:
+            i = self.ids[id(obj)] = len(self.objects)
+            self.objects.append(obj)  # keeps it alive, so its id is never reused
+        return i
+
+
+# what a snapshot keeps of an object's attributes, in a few pickled objects
+# instead of a __dict__ (a Monster's used to be ~190 of them): the numbers
+# packed into one struct, the rest in a tuple. The names and kinds strings
+# are shared by every object with the same layout, so the pickle memo
+# stores them once, and the work of splitting the values up is done once
+# per layout.
+_FIELD_KINDS = {int: 'q', float: 'd', bool: '?', type(None): 'x'}  # 'o' for anything else
+_FIELD_LAYOUTS = {}  # (names, kinds or the values' types) -> field_layout_nt
+_SLOT_FIELDS = {}  # (class, skipped names) -> slot_fields()
+
+field_layout_nt = collections.namedtuple('field_layout_nt', 'names, kinds, struct, number_mask, other_mask, '
+                                                            'unpacked_names, nones')
+
+
+def slot_fields(cls, skip=()):
+    """the slot names along cls' __mro__, less skip, and an attrgetter
+    for their values"""
+    fields = _SLOT_FIELDS.get((cls, skip))
+    if fields is None:
+        names = tuple(name for c in cls.__mro__ for name in c.__dict__.get('__slots__', ()) if name not in skip)
+        getter = operator.attrgetter(*names) if len(names) != 1 else lambda obj: (getattr(obj, names[0]),)
+        fields = _SLOT_FIELDS[cls, skip] = names, getter
+    return fields
+
+
+def _field_layout(names, kinds):
+    """names is a tuple when packing and the joined string when unpacking;
+    either finds the same layout"""
+    layout = _FIELD_LAYOUTS.get((names, kinds))
+    if layout is None:
+        split = tuple(names.split()) if isinstance(names, str) else names
+        joined = ' '.join(split)
+        layout = _FIELD_LAYOUTS[split, kinds] = _FIELD_LAYOUTS[joined, kinds] = field_layout_nt(
+            joined, kinds, struct.Struct('=' + kinds.replace('o', '')),  # an 'x' is a pad byte, no value
+            [k in 'qd?' for k in kinds], [k == 'o' for k in kinds],
+            tuple(n for k_in in ('qd?', 'o', 'x') for n, k in zip(split, kinds) if k in k_in),  # as unpack_fields has them
+            (None,) * kinds.count('x'))
+    return layout
+
+
+def pack_fields(names, values):
+    """a tuple of attribute names and their values -> (names, kinds, numbers,
+    others) for unpack_fields"""
+    types = tuple(map(type, values))
+    layout = _FIELD_LAYOUTS.get((names, types))
+    if layout is None:
+        layout = _FIELD_LAYOUTS[names, types] = _field_layout(names, ''.join(_FIELD_KINDS.get(t, 'o') for t in types))
+    try:
+        packed = layout.struct.pack(*itertools.compress(values, layout.number_mask))
+    except struct.error:  # an int too big for 'q': keep those with the others
+        kinds = ''.join(['o' if k == 'q' and not -2 ** 63 <= v < 2 ** 63 else k for v, k in zip(values, layout.kinds)])
+        layout = _field_layout(names, kinds)
+        packed = layout.struct.pack(*itertools.compress(values, layout.number_mask))
+    return layout.names, layout.kinds, packed, tuple(itertools.compress(values, layout.other_mask))
+
+
+def unpack_fields(fields):
+    """the attributes given to pack_fields, as a dict"""
+    names, kinds, packed, others = fields
+    layout = _field_layout(names, kinds)
+    return dict(zip(layout.unpacked_names, layout.struct.unpack(packed) + others + layout.nones))
+
+
+def _shared_ref(i):
+    """stands for refs.objects[i] in a snapshot; _SnapshotUnpickler swaps
+    in the real lookup"""
+    raise pickle.UnpicklingError('snapshot loaded without its SnapshotRefs')
+
+
+class _SnapshotPickler(pickle.Pickler):
+    def __init__(self, file, refs):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.refs = refs
+        self.ids = refs.ids
+
+    if sys.version_info >= (3, 8):
+        def reducer_override(self, obj):
+            # not called for ints, strs, tuples, lists, dicts and the like,
+            # which are most of a snapshot, nor for anything already pickled
+            i = self.ids.get(id(obj))
+            if i is None:
+                if type(obj) not in SnapshotRefs.SHARED_TYPES or obj is _shared_ref:
+                    return NotImplemented
+                i = self.refs.add(obj)
+            return _shared_ref, (i,)
+    else:
+        def persistent_id(self, obj):
+            # called for every object pickled, so this is kept to the bone
+            i = self.ids.get(id(obj))
+            if i is None and type(obj) in SnapshotRefs.SHARED_TYPES:
+                i = self.refs.add(obj)
+            return i
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+    def __init__(self, file, refs):
+        super().__init__(file)
+        self.refs = refs
+
+    def persistent_load(self, pid):
+        return self.refs.objects[pid]
+
+    def find_class(self, module, name):
+        if module == __name__ and name == '_shared_ref':
+            return self.refs.objects.__getitem__
+        return super().find_class(module, name)
+
+
+def take_snapshot(state, refs):
+    """packs state (any picklable structure, sharing refs' objects) into
+    one bytes buffer"""
+    f = io.BytesIO()
+    _SnapshotPickler(f, refs).dump(state)
+    return f.getvalue()
+
+
+def load_snapshot(buffer, refs):
+    return _SnapshotUnpickler(io.BytesIO(buffer), refs).load()
+
 # -------------------------------------------------------------------------
 class GameTime:
     def __init__(self):
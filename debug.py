@@ -1,3 +1,6 @@
+import gc
+import time
+from collections import deque
 from collections import namedtuple
 
 collision_points = namedtuple('collision_points', 'T, TR, R, BR, B, BL, L, TL')
@@ -28,3 +31,54 @@ def get_collision_data(player, arena):
         all_collision_data.append(
             collision_data(terr, _determine_collision_points(player, terr), _determine_collision_sides(player, terr)))
     return all_collision_data
+
+
+# ----------------------------------------------------------------------------
+_gc_seconds = [0.0, 0.0]  # total time spent collecting, start of the current collection
+
+
+def _time_gc(phase, info):
+    if phase == 'start':
+        _gc_seconds[1] = time.perf_counter()
+    else:
+        _gc_seconds[0] += time.perf_counter() - _gc_seconds[1]
+
+gc.callbacks.append(_time_gc)
+
+
+class FrameProfiler:
+    """how long each stage of the last few hundred frames took, for the
+    debug overlay; lap(stage) charges stage with the time since the last lap"""
+    STAGES = ('inputs', 'monsters', 'particles', 'events', 'draw', 'overlay', 'flip')
+
+    def __init__(self, history=240):
+        self.frame_ms = deque(maxlen=history)
+        self.stage_ms = {stage: deque(maxlen=history) for stage in self.STAGES}
+        self.gc_ms = deque(maxlen=history)  # overlaps the stages it happened in
+        self.current = dict.fromkeys(self.STAGES, 0.0)
+        self.begin_frame()
+
+    def begin_frame(self):
+        self.last = self.frame_start = time.perf_counter()
+        self.gc_start = _gc_seconds[0]
+        for stage in self.STAGES:
+            self.current[stage] = 0.0
+
+    def lap(self, stage):
+        now = time.perf_counter()
+        self.current[stage] += now - self.last
+        self.last = now
+
+    def end_frame(self):
+        self.frame_ms.append((self.last - self.frame_start) * 1000)
+        for stage in self.STAGES:
+            self.stage_ms[stage].append(self.current[stage] * 1000)
+        self.gc_ms.append((_gc_seconds[0] - self.gc_start) * 1000)
+
+    @staticmethod
+    def mean(samples):
+        return sum(samples) / len(samples) if samples else 0.0
+
+    def p99(self):
+        ordered = sorted(self.frame_ms)
+        return ordered[int(len(ordered) * 0.99)] if ordered else 0.0
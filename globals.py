@@ -6,6 +6,7 @@ class Imports:
     import sys
     from collections import namedtuple
     from collections import defaultdict
+    from collections import OrderedDict
 
     # psutil  (download here:  http://www.lfd.uci.edu/~gohlke/pythonlibs/#psutil)
     try:
@@ -14,6 +15,13 @@ class Imports:
     except ImportError:
         psutil_found = False
 
+    # numpy  (optional; batches RangeParticle motion, see classes.RangeMotion)
+    try:
+        import numpy
+        numpy_found = True
+    except ImportError:
+        numpy_found = False
+
     locals_dict = dict(locals().items())
     for k, v in locals_dict.items():
         sys.modules[__name__].__dict__[k] = v
@@ -239,9 +247,15 @@ class PygameImports:
 
 
 class Setup:
-    if os.environ['COMPUTERNAME'] == 'BRIAN-DESKTOP':
+    # headless mode (see headless.py): no window, no audio device
+    headless = os.environ.get('FAMISHED_HEADLESS') == '1'
+    if headless:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+    if os.environ.get('COMPUTERNAME') == 'BRIAN-DESKTOP':
         os.environ['SDL_VIDEO_WINDOW_POS'] = '{},{}'.format(1920, 230)
-    if os.environ['COMPUTERNAME'] in ('MAX-LT', 'BRIAN-LAPTOP'):
+    if os.environ.get('COMPUTERNAME') in ('MAX-LT', 'BRIAN-LAPTOP'):
         os.environ['SDL_VIDEO_WINDOW_POS'] = '{},{}'.format(50, 30)
 
     pygame.init()
@@ -254,10 +268,39 @@ def add_to_module_namespace(locals_dict):
 
 
 class Constants:
+    HEADLESS = Setup.headless
+    RECORD_DIR = os.environ.get('FAMISHED_RECORD_DIR')  # if set, every match's inputs are saved here
     SCREEN = pygame.display.set_mode((1280, 600))
     WINDOW = SCREEN.get_rect()
     CLOCK = pygame.time.Clock()
-    FPS = 30
+    FPS = 30  # menu pages
+
+    # Game loop timing: the simulation runs in fixed steps of SIM_STEP_MSEC,
+    # rendering runs as fast as RENDER_FPS allows (0 = uncapped) and
+    # interpolates between the last two steps.  All the physics constants
+    # (speeds, gravity, friction, particle paths) are per step and were tuned
+    # at 30 steps per second, so change SIM_FPS only together with those.
+    SIM_FPS = 30
+    SIM_STEP_MSEC = 1000 / SIM_FPS
+    RENDER_FPS = 120
+    MAX_CATCH_UP_STEPS = 5  # most steps run per render before the game slows down instead
+    SNAP_DISTANCE = 100  # don't interpolate moves longer than this (teleports, respawns)
+    MONSTER_GRID_MIN = 24  # below this many monsters, field particles check them one by one
+    RANGE_BATCH_MIN = 48  # default-path RangeParticles moving before classes.RangeMotion uses numpy
+
+    # Particle budget (see classes.ParticleBudget): category -> (cap on live
+    # particles or None, priority). A skill's particles are in the category
+    # of its type unless SKILLS_TABLE[sid]['budget'] says otherwise.
+    PARTICLE_BUDGETS = {'melee': (None, 2), 'field': (None, 2), 'range': (160, 1), 'swarm': (96, 0)}
+    PARTICLE_CATEGORIES = {'MELEE': 'melee', 'RANGED': 'range', 'FIELD': 'field'}
+    SWARM_MERGE_LIMIT = 3  # most swarm particles one may stand for; past that, thinned ones are dropped
+    PARTICLE_LIMIT = 256  # live particles past which only the top priority may add more
+    PARTICLE_DRAW_LIMIT = 160  # particles drawn in a frame before swarm particles are skipped
+    ROTATING_PARTICLES = (5, 112, 123, 125, 'beehive')  # drawn spinning; melee particles turn with their swing
+    ROTATION_STEPS = 64  # angles per revolution that particle images are turned to (see classes.RotationCache)
+    ROTATION_CACHE_BYTES = 32 * 2 ** 20
+    TEXT_CACHE_SIZE = 512  # rendered text surfaces kept (see TextCache)
+    DIRTY_AREA_LIMIT = 0.5  # fraction of the screen changed past which the whole display is updated
     NEXT_PAGE = '_start'
 
     # Music
@@ -356,15 +399,17 @@ class Constants:
     ST_LEVEL_UP = 'ST_LEVEL_UP'
 
     # Events
-    TIME_TICK_EVENT = USEREVENT + 0
-    PLAYER1_LOCK_EVENT = USEREVENT + 1
-    PLAYER2_LOCK_EVENT = USEREVENT + 2
-    PLAYER1_PICKUP_EVENT = USEREVENT + 3
-    PLAYER2_PICKUP_EVENT = USEREVENT + 4
-    REGENERATION_EVENT = USEREVENT + 5
-    MONSTER_SPAWN_EVENT = USEREVENT + 6
     SONG_END_EVENT = USEREVENT + 7
-    MORE_RAIN_EVENT = USEREVENT + 8
+
+    # Timers (keys into GameLoop.scheduler; these run on simulated time)
+    TIME_TICK_TIMER = 'TIME_TICK_TIMER'
+    REGENERATION_TIMER = 'REGENERATION_TIMER'
+    MONSTER_SPAWN_TIMER = 'MONSTER_SPAWN_TIMER'
+    MORE_RAIN_TIMER = 'MORE_RAIN_TIMER'
+    PLAYER1_LOCK_TIMER = 'PLAYER1_LOCK_TIMER'
+    PLAYER2_LOCK_TIMER = 'PLAYER2_LOCK_TIMER'
+    PLAYER1_PICKUP_TIMER = 'PLAYER1_PICKUP_TIMER'
+    PLAYER2_PICKUP_TIMER = 'PLAYER2_PICKUP_TIMER'
 
     add_to_module_namespace(locals())
 
@@ -444,23 +489,6 @@ class Functions:
         st += str(right)
         return st
 
-    def force_add_particle_to_player(particle, player):
-        if isinstance(particle, list):
-            if player.new_particle is None:
-                player.new_particle = particle
-            elif isinstance(player.new_particle, list):
-                player.new_particle += particle
-            else:
-                player.new_particle = [player.new_particle] + particle
-
-        else:
-            if player.new_particle is None:
-                player.new_particle = particle
-            elif isinstance(player.new_particle, list):
-                player.new_particle.append(particle)
-            else:
-                player.new_particle = [player.new_particle, particle]
-
     # noinspection PyPep8Naming
     def EXIT_GAME():
         pygame.quit()
@@ -499,11 +527,14 @@ class Colors:
 class Audio:
     def __init__(self):
         try:
+            if HEADLESS:
+                raise pygame.error('no audio when headless')
             pygame.mixer.init(44100)
             self.audio_device_found = True
         except pygame.error:
             self.audio_device_found = False
         self.menu_song = self.curr_song = 'data/songs/404error.mp3'
+        self.rng = random.Random()  # not the game's: songs must not shift the seeded simulation
         self.music_on = self.sound_on = False
 
     def restart_music(self):
@@ -538,7 +569,7 @@ class Audio:
 
     def play_next_random_song(self):
         if self.audio_device_found:
-            self.curr_song = random.choice([s for s in SONGS if s != self.curr_song])
+            self.curr_song = self.rng.choice([s for s in SONGS if s != self.curr_song])
             pygame.mixer.music.load(self.curr_song)
             pygame.mixer.music.play()
             pygame.mixer.music.set_endevent(SONG_END_EVENT)
@@ -550,6 +581,34 @@ class Audio:
 AUDIO = Audio()
 
 
+class TextCache:
+    """every piece of text the game draws, rendered once and kept until
+    TEXT_CACHE_SIZE others have been drawn since. The surfaces are shared, so
+    blit them but don't draw on them."""
+    def __init__(self, size=TEXT_CACHE_SIZE):
+        self.size = size
+        self.surfaces = OrderedDict()  # (font, text, antialias, color, background) -> surface, oldest first
+        self.hits = self.misses = 0
+
+    def render(self, font, text, antialias, color, background=None):
+        """font.render(text, antialias, color, background), from the cache if it can"""
+        key = font, text, antialias, tuple(color), background if background is None else tuple(background)
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self.surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        if background is None:
+            surface = self.surfaces[key] = font.render(text, antialias, color)
+        else:
+            surface = self.surfaces[key] = font.render(text, antialias, color, background)
+        if len(self.surfaces) > self.size:
+            self.surfaces.popitem(last=False)
+        return surface
+TEXT_CACHE = TextCache()
+
+
 class Input:
     def __init__(self, player_id=1):
         self.gp_input = defaultdict(bool)
@@ -589,6 +648,8 @@ class Input:
                 self.gamepad_found = False
                 print('p{} cannot play!'.format(str(self.player_id)))
 
+        self._combine_all_pressed()  # everything starts released
+
     def __setup_gamepad_buttons__(self):
         input_nt = namedtuple('input_nt', 'kind, number, value1, value2')
 
@@ -651,13 +712,14 @@ class Input:
 
     def refresh(self):
         self._reset_all_event_flags()
-        if self.player_id == 1:
-            self._get_keyboard_pressed()
-            self._get_keyboard_events()
-        self._get_gamepad_pressed_and_events()
-        self._combine_all_pressed()
+        if not HEADLESS:  # headless pressed flags are written directly by the driver
+            if self.player_id == 1:
+                self._get_keyboard_pressed()
+                self._get_keyboard_events()
+            self._get_gamepad_pressed_and_events()
+            self._combine_all_pressed()
         self._combine_all_events()
-        if self.player_id == 1:
+        if self.player_id == 1 and not HEADLESS:
             self._handle_mouse_visibility()
         # self._debug()
 
@@ -928,13 +990,16 @@ class MonsterInfos:
 
     add_to_module_namespace(locals())
 
+MOUSE_DEBUG_FONT = pygame.font.SysFont('consolas', 12)
+
+
 def draw_mouse_debug():
     if INPUT1.DEBUG_MODE_ON:
         pygame.mouse.set_visible(False)
         mouse_pos = pygame.mouse.get_pos()
         pygame.draw.circle(SCREEN, WHITE, mouse_pos, 2, 0)
         pygame.draw.circle(SCREEN, BLACK, mouse_pos, 2, 1)
-        real_pos_mouse_font = pygame.font.SysFont('consolas', 12).render(str(mouse_pos), True, DKYELLOW)
+        real_pos_mouse_font = TEXT_CACHE.render(MOUSE_DEBUG_FONT, str(mouse_pos), True, DKYELLOW)
         SCREEN.blit(real_pos_mouse_font, (mouse_pos[0] + 3, mouse_pos[1] + 10))
     else:
         pygame.mouse.set_visible(True)
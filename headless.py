@@ -0,0 +1,219 @@
+"""
+Headless simulation engine.
+
+Runs full matches with no window, no audio device and no frame limiting,
+stepping the simulation as fast as the CPU allows.  Timers run on simulated
+time (see classes.Scheduler), so a headless match plays out exactly like a
+windowed one, only faster.
+
+Usage:
+    python headless.py [num_matches] [ticks_per_match]
+    python headless.py replay <recording.famrec> [times]
+    python headless.py check
+
+Recordings come from playing with FAMISHED_RECORD_DIR set (see
+classes.InputRecording) and replay frame for frame, so a spike or bug seen in
+a real match can be reproduced and profiled offline.
+
+check plays a few seeded matches that compare the simulation's fast paths
+against the plain ones and exits non-zero if any of them disagree.
+"""
+
+# python standard library modules
+import os
+import time
+import zlib
+
+os.environ['FAMISHED_HEADLESS'] = '1'  # must be set before globals is imported
+
+# our modules
+import classes
+from main import *
+
+
+# ----------------------------------------------------------------------------
+class HeadlessMatch:
+    def __init__(self, arena_info=None, seed=None, p1_skills=None, p2_skills=None):
+        """arena_info is one of the arena_nt's from globals (default arena3),
+        p1_skills/p2_skills are optional [attack, skill1, skill2, skill3, ult]
+        loadouts"""
+        GL.SELECTED_ARENA = Arena(arena_info if arena_info is not None else GL.arena3)
+        self.game = GameLoop(seed)
+        self.seed = self.game.seed
+        self.ticks = 0
+
+        for player, skills in ((self.game.player1, p1_skills), (self.game.player2, p2_skills)):
+            if skills is not None:
+                player.attack_id, player.skill1_id, player.skill2_id, player.skill3_id, player.ult_id = skills
+        self.set_inputs(GL.INPUT1)
+        self.set_inputs(GL.INPUT2)
+
+    @staticmethod
+    def set_inputs(inp, pressed=()):
+        """holds down exactly the flags named in pressed for one Input"""
+        for flag in INPUT_FLAGS:
+            setattr(inp, flag, flag in pressed)
+
+    @property
+    def game_over(self):
+        return self.game.return_now
+
+    def step(self, p1_pressed=None, p2_pressed=None):
+        """advances one frame; pressed=None keeps the previous frame's inputs"""
+        if p1_pressed is not None:
+            self.set_inputs(GL.INPUT1, p1_pressed)
+        if p2_pressed is not None:
+            self.set_inputs(GL.INPUT2, p2_pressed)
+        self.game.step()
+        self.ticks += 1
+
+    def run(self, ticks, p1_policy=None, p2_policy=None):
+        """steps until ticks frames have run or the game is over;
+        policies are f(match) -> pressed flags, called every frame"""
+        for _ in range(ticks):
+            if self.game_over:
+                break
+            self.step(p1_policy(self) if p1_policy else None,
+                      p2_policy(self) if p2_policy else None)
+        return self.ticks
+
+
+# ----------------------------------------------------------------------------
+def replay(recording):
+    """plays a recording back as fast as possible; returns the match, whose
+    digest_ok says whether it ended in the recorded state"""
+    match = HeadlessMatch(recording.arena_info, recording.seed, recording.p1_skills, recording.p2_skills)
+    for step in range(len(recording)):
+        p1_bits, p2_bits = recording[step]
+        match.step(unpack_input(p1_bits), unpack_input(p2_bits))
+    match.digest_ok = recording.digest is None or recording.digest == match.game.state_digest()
+    return match
+
+
+def replay_file(path, times=1):
+    recording = InputRecording.load(path)
+    for n in range(times):
+        start = time.perf_counter()
+        match = replay(recording)
+        elapsed = time.perf_counter() - start
+        print('replay {:>4}: {:>6} ticks in {:>7.3f}s ({:>8.0f} ticks/s)  {}'.format(
+            n, match.ticks, elapsed, match.ticks / elapsed if elapsed else 0,
+            'ok' if match.digest_ok else 'DESYNC'))
+
+
+def button_masher(seed):
+    """a policy that presses random buttons; it has its own RNG so it does
+    not disturb the game's random stream"""
+    rng = random.Random(seed)
+
+    def _policy(match):
+        return [flag for flag in INPUT_FLAGS if flag != 'DROP_SKILL' and rng.random() < 0.3]
+    return _policy
+
+
+def run_headless_matches(num_matches, ticks, arena_info=None):
+    results = []
+    for n in range(num_matches):
+        start = time.perf_counter()
+        match = HeadlessMatch(arena_info, seed=n)
+        match.run(ticks, button_masher(n * 2), button_masher(n * 2 + 1))
+        elapsed = time.perf_counter() - start
+        results.append((n, match.ticks, elapsed))
+        print('match {:>4}: {:>6} ticks in {:>7.3f}s ({:>8.0f} ticks/s){}'.format(
+            n, match.ticks, elapsed, match.ticks / elapsed if elapsed else 0,
+            '  game over' if match.game_over else ''))
+    return results
+
+# ----------------------------------------------------------------------------
+def _particle_states(game):
+    """every particle's rect and plain attributes, repr'd so 7 and 7.0 differ"""
+    skipped = ('motion_slot', 'generation')  # differ between paths, or from match to match
+
+    def _plain(v):
+        return isinstance(v, (int, float, str, type(None))) or isinstance(v, tuple) and all(map(_plain, v))
+
+    states = []
+    for p in game.active_particles:
+        names = [n for c in type(p).__mro__ for n in c.__dict__.get('__slots__', ())] + sorted(p.__dict__)
+        states.append(repr((type(p).__name__, tuple(p), [(n, getattr(p, n)) for n in names
+                                                         if n not in skipped and _plain(getattr(p, n))])))
+    return states
+
+
+def check_range_batching(ticks=SIM_FPS * 60, seed=1):
+    """RangeMotion's numpy path has to leave every particle just as
+    RangeParticle.update would, types included, or snapshots and digests
+    would depend on whether numpy is installed. Returns a problem or None."""
+    if not numpy_found:
+        return None
+
+    def _run(batch_min, ticks):
+        """the particles' states after every tick, as checksums, and the
+        states themselves after the last one"""
+        classes.RANGE_BATCH_MIN = batch_min
+        match = HeadlessMatch(seed=seed, p1_skills=[110, 103, 108, 116, 1004], p2_skills=[2, 5, 7, 101, 1001])
+        GL.INPUT1.P1_ININITE_HEALTH_ENERGY_ON = True
+        p1, p2 = button_masher(seed * 2), button_masher(seed * 2 + 1)
+        checksums = []
+        for _ in range(ticks):
+            match.step(p1(match), p2(match))
+            states = _particle_states(match.game)
+            checksums.append(zlib.crc32(repr(states).encode()))
+        return checksums, states
+
+    batch_min = RANGE_BATCH_MIN
+    try:
+        batched, plain = _run(0, ticks)[0], _run(float('inf'), ticks)[0]
+        if batched == plain:
+            return None
+        tick = next(t for t, (b, p) in enumerate(zip(batched, plain)) if b != p)
+        batched, plain = _run(0, tick + 1)[1], _run(float('inf'), tick + 1)[1]
+        return 'tick {}: {} instead of {}'.format(tick, *next((b, p) for b, p in zip(batched + [None], plain + [None])
+                                                              if b != p))
+    finally:
+        classes.RANGE_BATCH_MIN = batch_min
+
+
+def check_swarm_merging(sid='bee1', per_tick=40, ticks=SIM_FPS * 2, seed=1):
+    """floods one swarm sid far past its cap; the particles thinned ones are
+    merged into must still stay within SWARM_MERGE_LIMIT of the skill's own
+    damage and size. Returns a problem or None."""
+    match = HeadlessMatch(seed=seed)
+    game, spec = match.game, particle_spec(sid)
+    caps = SWARM_MERGE_LIMIT * spec.dmg, SWARM_MERGE_LIMIT * spec.width, SWARM_MERGE_LIMIT * spec.height
+    for _ in range(ticks):
+        for _ in range(per_tick):
+            p = classes.RangeParticle(sid, game.player1, False, False)
+            p.center = game.player1.center
+            game.add_particle(p)
+        match.step()
+        for p in game.active_particles:
+            if p.sid == sid and (p.dmg > caps[0] or p.width > caps[1] or p.height > caps[2]):
+                return 'tick {}: a {} with dmg {} and size {}x{}, over {} and {}x{}'.format(
+                    match.ticks, sid, p.dmg, p.width, p.height, *caps)
+    if not game.particle_budget.counters['merged']:
+        return 'nothing was merged'
+    return None
+
+
+CHECKS = [check_range_batching, check_swarm_merging]
+
+
+def run_checks():
+    failed = 0
+    for check in CHECKS:
+        problem = check()
+        print('{:<28} {}'.format(check.__name__, 'ok' if problem is None else 'FAILED ' + problem))
+        failed += problem is not None
+    return failed
+
+# ----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == 'replay':
+        replay_file(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 1)
+        sys.exit()
+    if len(sys.argv) > 1 and sys.argv[1] == 'check':
+        sys.exit(1 if run_checks() else 0)
+    run_headless_matches(int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+                         int(sys.argv[2]) if len(sys.argv) > 2 else SIM_FPS * 60 * 3)
@@ -1,3 +1,8 @@
+# python standard library modules
+import array
+import collections
+import zlib
+
 # our modules
 from debug import *
 from pages import *
@@ -20,14 +25,19 @@ class Application:
 
 # ----------------------------------------------------------------------------
 class GameLoop:
-    def __init__(self):
+    def __init__(self, seed=None):
         def _setup_time():
-            pygame.time.set_timer(TIME_TICK_EVENT, 250)
-            pygame.time.set_timer(REGENERATION_EVENT, 1000)
             self.game_time = GameTime()
+            self.scheduler = Scheduler()
+            self.scheduler.schedule_every(250, self.on_time_tick, key=TIME_TICK_TIMER)
+            self.scheduler.schedule_every(1000, self.on_regeneration, key=REGENERATION_TIMER)
 
         def _setup_ui():
             self.bg_image = image_load('data/backgrounds/bg_menus.png')
+            self.static_layer = pygame.Surface(GL.SCREEN.get_size()).convert()  # see draw_screen
+            self.static_layer_arena = self.static_layer_version = None
+            self.dirty = DirtyRects(GL.SCREEN.get_rect())  # see draw_screen
+            self.debug_mode_shown = False  # see draw_debug
             self.return_button = PygButton((490, 550, 300, 50), 'Main Menu')
             self.window_border = Rect2(left=0, top=0, width=1280, height=600)
             self.play_area_border = Rect2(left=60, top=0, width=1160, height=485)
@@ -54,7 +64,8 @@ class GameLoop:
 
         def _setup_arena():
             self.arena = GL.SELECTED_ARENA
-            self.arena_image = image_load(self.arena.background)
+            if not HEADLESS:
+                self.arena_image = image_load(self.arena.background)
 
         def _setup_skills():
             initialize_skill_table()
@@ -82,7 +93,7 @@ class GameLoop:
 
         def _setup_fonts():
             # main_font = 'data/viner-hand-itc.ttf'
-            main_font = 'data/fonts/Kremlin.ttf'
+            main_font = 'data/fonts/kremlin.ttf'
             self.timer_font = pygame.font.Font(main_font, 36)
             self.timer_font_xy = 605, 500
             self.debug_font_small = pygame.font.SysFont('consolas', 12)  # monospace
@@ -97,6 +108,9 @@ class GameLoop:
             self.debug_font_xy7 = 800, 540
             self.cpu_avg = 0.0
             self.cpu_deque = Deque2((0,), maxlen=5)
+            self.profiler_panel = pygame.Surface((330, 263))
+            self.profiler_panel.fill(BLACK)
+            self.profiler_panel.set_alpha(190)
 
             # Scrolling text stuff
             self.st_dmg_font = pygame.font.Font(main_font, 12)
@@ -111,14 +125,20 @@ class GameLoop:
             self.oor_font = pygame.font.Font(main_font, 20)
 
         def _setup_particles():
-            self.active_particles = []
+            self.active_particles = ParticleSlots()
+            self.particle_budget = ParticleBudget()
+            self.range_motion = RangeMotion() if numpy_found else None
+            self.monster_grid = SpatialHash()
+            self.monster_centers = MonsterCenters() if numpy_found else None
 
         def _setup_monsters():
             self.active_monsters = []
             self.ultimate_monster_active = False
             self.dropped_skills = []
             self.spawn_monsters = False
-            pygame.event.post(pygame.event.Event(MONSTER_SPAWN_EVENT))
+            self.scheduler.schedule_every(10000, self.on_monster_spawn, key=MONSTER_SPAWN_TIMER, delay=0)
+            if HEADLESS:
+                return
 
             self.weak_monster_image = image_load('data/sprites+portraits/monster_weak.png')
             self.medium_monster_image = image_load('data/sprites+portraits/monster_medium.png')
@@ -132,7 +152,7 @@ class GameLoop:
             self.rain_particles = []
             self.rain = Rect2(left=0, top=0, width=1, height=3)
             self.make_rain = False
-            pygame.event.post(pygame.event.Event(MORE_RAIN_EVENT))
+            self.scheduler.schedule_every(150, self.on_more_rain, key=MORE_RAIN_TIMER, delay=0)
 
         def _setup_players():
 
@@ -144,64 +164,177 @@ class GameLoop:
                     return None
 
                 m1 = []
-                # Put spritesheet into list, each sprite is 64x64 pixels large, except for death
+                # Where each sprite is on the spritesheet, each 64x64 pixels large, except for death
                 for num in range(1, 8):  # Standing
-                    m1.append(spritesheet1.subsurface((64 * (num - 1), 0, 64, 64)))
+                    m1.append((64 * (num - 1), 0, 64, 64))
                 for num in range(8, 16):  # Walk Transition
-                    m1.append(spritesheet1.subsurface((64 * (num - 8), 64, 64, 64)))
+                    m1.append((64 * (num - 8), 64, 64, 64))
                 for num in range(16, 24):  # Walk Part 1
-                    m1.append(spritesheet1.subsurface((64 * (num - 16), 128, 64, 64)))
+                    m1.append((64 * (num - 16), 128, 64, 64))
                 for num in range(24, 32):  # Walk Part 2
-                    m1.append(spritesheet1.subsurface((64 * (num - 24), 192, 64, 64)))
+                    m1.append((64 * (num - 24), 192, 64, 64))
                 for num in range(32, 40):  # Jump and Fall
-                    m1.append(spritesheet1.subsurface((64 * (num - 32), 256, 64, 64)))
+                    m1.append((64 * (num - 32), 256, 64, 64))
                 for num in range(40, 48):
-                    m1.append(spritesheet1.subsurface((64 * (num - 40), 320, 64, 64)))
+                    m1.append((64 * (num - 40), 320, 64, 64))
                 for num in range(48, 56):
-                    m1.append(spritesheet1.subsurface((64 * (num - 48), 384, 64, 64)))
+                    m1.append((64 * (num - 48), 384, 64, 64))
                 for num in range(56, 64):
-                    m1.append(spritesheet1.subsurface((64 * (num - 56), 448, 64, 64)))
+                    m1.append((64 * (num - 56), 448, 64, 64))
                 for num in range(64, 71):
-                    m1.append(spritesheet1.subsurface((64 * (num - 64), 512, 64, 64)))
+                    m1.append((64 * (num - 64), 512, 64, 64))
                 for num in range(71, 75):
-                    m1.append(spritesheet1.subsurface((128 * (num - 71), 576, 128, 64)))
-
-                for num in range(len(m1)):
-                    m1[num].set_colorkey((0, 0, 0))  # sprite bg rgb is (0,0,0)
-                    m1[num] = m1[num].convert_alpha()
+                    m1.append((128 * (num - 71), 576, 128, 64))
 
-                return m1
+                return PlayerSprites(spritesheet1, m1)  # sprite bg rgb is (0,0,0)
 
-            self.player1 = Player(id=1, topleft=self.arena.p1_spawn, sprite=_setup_player_sprites(GL.P1_SPRITESHEET))
-            self.player2 = Player(id=2, topleft=self.arena.p2_spawn, sprite=_setup_player_sprites(GL.P2_SPRITESHEET))
+            if HEADLESS:
+                self.player1 = Player(id=1, topleft=self.arena.p1_spawn)
+                self.player2 = Player(id=2, topleft=self.arena.p2_spawn)
+            else:
+                self.player1 = Player(id=1, topleft=self.arena.p1_spawn, sprite=_setup_player_sprites(GL.P1_SPRITESHEET))
+                self.player2 = Player(id=2, topleft=self.arena.p2_spawn, sprite=_setup_player_sprites(GL.P2_SPRITESHEET))
+            self.player1.scheduler = self.player2.scheduler = self.scheduler
 
             self.player1.opposite = self.player2  # Makes things a lot easier
             self.player2.opposite = self.player1  # Makes things a lot easier
 
+        def _setup_rotations():
+            # every angle of the spinning particles the loadouts can make,
+            # turned now rather than on the frame they first show up
+            self.rotations = RotationCache(PARTICLES_TABLE)
+            melee = [sid for sid in self.player1.skills + self.player2.skills
+                     if SKILLS_TABLE[sid].get('type') == MELEE]
+            self.rotations.prewarm(melee + list(ROTATING_PARTICLES))
+
+        # everything random in a match comes from this seed, so a recording
+        # of the inputs is enough to replay it
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        random.seed(self.seed)
+
         _setup_time()
-        _setup_ui()
+        if not HEADLESS:
+            _setup_ui()
         _setup_arena()
         _setup_skills()
         _setup_monsters()
-        _setup_fonts()
+        if not HEADLESS:
+            _setup_fonts()
         _setup_particles()
-        _setup_music()
-        _setup_rain()
+        if not HEADLESS:
+            _setup_music()
+            _setup_rain()
         _setup_players()
+        if not HEADLESS:
+            _setup_rotations()
+        self.return_now = False
+        self.steps_since_draw = 0
+        self.render_alpha = 1.0
+        self.profiler = FrameProfiler()
+        self.snapshot_refs = SnapshotRefs([self, GL.INPUT1, GL.INPUT2, self.player1.sprite, self.player2.sprite,
+                                           self.arena.arena_info])
+        self.recording = None
+        if RECORD_DIR:
+            self.recording = InputRecording.for_game(self)
+            self.recording_path = os.path.join(RECORD_DIR, '{}-{}.famrec'.format(
+                datetime.datetime.now().strftime('%Y%m%d-%H%M%S'), self.seed))
 
     # ------------------------------------------------------------------------
     def __call__(self):
         self.return_now = False
+        accumulator = 0.0
+        GL.CLOCK.tick()  # don't simulate the time spent on other pages
+        self.dirty.add_all()  # nor trust what they left on the display
         while not self.return_now:
-            self.handle_players_inputs()
-            self.handle_monsters(self.game_time.msec)
-            self.handle_particles()
+            # run as many fixed steps as the elapsed time calls for ...
+            accumulator += GL.CLOCK.tick(RENDER_FPS)
+            self.profiler.begin_frame()
+            steps = 0
+            while accumulator >= SIM_STEP_MSEC and steps < MAX_CATCH_UP_STEPS and not self.return_now:
+                self.step()
+                accumulator -= SIM_STEP_MSEC
+                steps += 1
+            if accumulator >= SIM_STEP_MSEC:  # still behind; drop the backlog so the game slows down instead of spiraling
+                accumulator %= SIM_STEP_MSEC
+
+            # ... then draw in between the last two of them
+            self.steps_since_draw = steps
+            self.render_alpha = accumulator / SIM_STEP_MSEC
             self.draw_screen()
+            self.profiler.lap('draw')
             self.draw_debug()
-            self.handle_event_queue()
-            self.check_if_game_over()
-            pygame.display.update()
-            GL.CLOCK.tick(GL.FPS)
+            self.profiler.lap('overlay')
+            self.dirty.update()
+            self.profiler.lap('flip')
+            self.profiler.end_frame()
+
+        if self.recording is not None:  # saved on every exit, the pause page may not come back
+            self.recording.digest = self.state_digest()
+            self.recording.save(self.recording_path)
+
+    def step(self):
+        """advances the simulation one fixed step without drawing, flipping
+        the display or waiting on the clock; this is what headless.py runs"""
+        if not HEADLESS:
+            self.save_previous_positions()
+        self.handle_players_inputs()
+        self.profiler.lap('inputs')
+        self.handle_monsters(self.game_time.msec)
+        self.profiler.lap('monsters')
+        self.handle_particles()
+        self.profiler.lap('particles')
+        self.handle_event_queue()
+        self.check_if_game_over()
+        self.profiler.lap('events')
+
+    # everything step() reads or changes; the rest of GameLoop is drawing
+    SIM_STATE = ('game_time', 'scheduler', 'arena', 'player1', 'player2',
+                 'active_monsters', 'ultimate_monster_active', 'spawn_monsters',
+                 'active_particles', 'range_motion', 'particle_budget', 'dropped_skills',
+                 'p1_red_skills_deque', 'p1_blue_skills1_deque', 'p1_blue_skills2_deque',
+                 'p1_blue_skills3_deque', 'p1_yellow_skills_deque',
+                 'p2_red_skills_deque', 'p2_blue_skills1_deque', 'p2_blue_skills2_deque',
+                 'p2_blue_skills3_deque', 'p2_yellow_skills_deque')
+
+    def snapshot(self):
+        """the whole simulation state, RNG included, as one bytes buffer"""
+        state = [getattr(self, name) for name in self.SIM_STATE]
+        version, internal, gauss_next = random.getstate()
+        state.append((version, array.array('I', internal).tobytes(), gauss_next))  # 1 object instead of 625
+        return take_snapshot(state, self.snapshot_refs)
+
+    def restore(self, snapshot):
+        """rewinds to a snapshot() of this same GameLoop"""
+        state = load_snapshot(snapshot, self.snapshot_refs)
+        version, internal, gauss_next = state.pop()
+        random.setstate((version, tuple(array.array('I', internal)), gauss_next))
+        for name, value in zip(self.SIM_STATE, state):
+            setattr(self, name, value)
+        GL.SELECTED_ARENA = self.arena
+        self.return_now = False  # a game over after the snapshot may not happen this time
+
+    def state_digest(self):
+        """a checksum of the simulation state, for checking that a replay
+        ended up where the recorded match did"""
+        state = [self.game_time.qsec, len(self.active_particles), len(self.arena.rects)]
+        for u in [self.player1, self.player2] + self.active_monsters:
+            state += [tuple(u), u.hit_points, getattr(u, 'energy', None)]
+        return zlib.crc32(repr(state).encode())
+
+    def save_previous_positions(self):
+        for e in [self.player1, self.player2] + self.active_monsters + list(self.active_particles):
+            e.prev_topleft = e.topleft
+
+    def lerp_topleft(self, e):
+        """where to draw e this frame: between its position before and after
+        the last step, by how far the clock is into the next one"""
+        prev = getattr(e, 'prev_topleft', None)
+        if prev is None:
+            return e.topleft
+        dx, dy = e.left - prev[0], e.top - prev[1]
+        if abs(dx) > SNAP_DISTANCE or abs(dy) > SNAP_DISTANCE:
+            return e.topleft
+        return int(prev[0] + dx * self.render_alpha), int(prev[1] + dy * self.render_alpha)
 
     # -------------------------------------------------------------------------
     def handle_players_inputs(self):
@@ -263,105 +396,141 @@ class GameLoop:
                 self.player2.energy = self.player2.energy_max
 
         _refresh_inputs()
+        if self.recording is not None:
+            self.recording.record(self.player1, self.player2)
         _handle_players_inputs()
         _handle_special_input()
 
     # -------------------------------------------------------------------------
+    def add_particle(self, p):
+        if not self.particle_budget.admit(p):
+            p.release()
+            return
+        self.active_particles.append(p)
+        if self.range_motion is not None and RangeMotion.wants(p):
+            self.range_motion.add(p)
+
+    def remove_particle(self, p):
+        self.active_particles.remove(p)
+        self.particle_budget.remove(p)
+        if p.motion_slot is not None:
+            self.range_motion.remove(p)
+        p.release()
+
     def handle_particles(self):
 
         def _update_active_particles():
-            if self.player1.new_particle:
-                if isinstance(self.player1.new_particle, list):
-                    for p in self.player1.new_particle:
-                        if isinstance(p, Particle):
-                            self.active_particles.append(p)
-                        else:
-                            self.arena.rects.append(Rect2(tuple(p)[0:4], color=p.color, hits_to_destroy=p.hits_to_destroy, spawn_point=p.spawn_point))
-                else:
-                    if isinstance(self.player1.new_particle, Particle):
-                        self.active_particles.append(self.player1.new_particle)
-                    else:
-                        p = self.player1.new_particle
-                        self.arena.rects.append(Rect2(tuple(p)[0:4], color=p.color, hits_to_destroy=p.hits_to_destroy, spawn_point=p.spawn_point))
-                self.player1.new_particle = None
-
-            if self.player2.new_particle:
-                if isinstance(self.player2.new_particle, list):
-                    for p in self.player2.new_particle:
-                        if isinstance(p, Particle):
-                            self.active_particles.append(p)
-                        else:
-                            self.arena.rects.append(Rect2(tuple(p)[0:4], color=p.color, hits_to_destroy=p.hits_to_destroy, spawn_point=p.spawn_point))
-                else:
-                    if isinstance(self.player2.new_particle, Particle):
-                        self.active_particles.append(self.player2.new_particle)
-                    else:
-                        p = self.player2.new_particle
-                        self.arena.rects.append(Rect2(tuple(p)[0:4], color=p.color, hits_to_destroy=p.hits_to_destroy, spawn_point=p.spawn_point))
-                self.player2.new_particle = None
+            self.player1.spawns.flush(self.add_particle, self.arena)
+            self.player2.spawns.flush(self.add_particle, self.arena)
 
         def _update_particles():
+            batch = []
+            on_paths = collections.OrderedDict()  # kind of Path -> range particles on one
             for p in self.active_particles:
                 if p.expired:
                     if p.on_expire_f:
                         p.on_expire_f(p)
-                    self.active_particles.remove(p)
+                    self.remove_particle(p)
+                elif p.motion_slot is not None:
+                    batch.append(p)
+                elif isinstance(p.special_f, Path) and isinstance(p, RangeParticle):
+                    on_paths.setdefault(type(p.special_f), []).append(p)
                 else:
                     p.update(self.game_time.msec)
+            for kind, particles in on_paths.items():
+                kind.update_all(particles, self.game_time.msec)
+            if batch:
+                self.range_motion.step(self.game_time.msec, batch)
 
         def _check_particle_collisions():
+            # broadphase for the tests that would otherwise loop in python:
+            # range particles vs. terrain (arena.terrain_grid) only look in
+            # their own grid cells, and field particles vs. monsters test
+            # every monster center at once with numpy (or, without it, only
+            # those in the field's grid cells). pygame's collidelist is
+            # quicker than any python lookup for the rest. The narrow tests
+            # and their order are the same as a plain scan of the lists.
+            if not self.active_particles:
+                return
+            rects, monsters, now = self.arena.rects, self.active_monsters, self.game_time.msec
+            monster_index = self.monster_centers if self.monster_centers is not None else self.monster_grid
+            monsters_indexed = False
+
+            def _monsters_in_field(p):
+                """the indices of the monsters within p's radius, in order"""
+                nonlocal monsters_indexed
+                if len(monsters) < MONSTER_GRID_MIN:
+                    return [i for i, m in enumerate(monsters) if p.is_in_field(m)]
+                if not monsters_indexed:
+                    monster_index.index(monsters)
+                    monsters_indexed = True
+                if monster_index is self.monster_centers:
+                    return monster_index.inside(p)
+                r = int(p.radius) + 1
+                return [i for i in monster_index.query((p.centerx - r, p.centery - r, 2 * r, 2 * r))
+                        if p.is_in_field(monsters[i])]
+
+            def _hit_monster(p, i):
+                p.on_hit(monsters[i], now)
+                if monsters_indexed:
+                    monster_index.move(i, monsters[i])  # on_hit pushes monsters back
+
+            def _damage_terrain(t):
+                t.hits_to_destroy -= 1
+                if t.hits_to_destroy == 0:
+                    self.arena.remove_terrain(t)
+
             for p in self.active_particles:
                 opposite = self.player2 if p.belongs_to == self.player1 else self.player1
 
                 # Ranged Particle
                 if isinstance(p, RangeParticle):
-                    # Check Terrains
-                    all_terrain_hit_i = p.p_collidelistall(self.arena.rects)
-                    if all_terrain_hit_i:  # False if empty list
+                    # Check Terrains, along the whole move so fast particles
+                    # can't step over thin walls
+                    all_terrain_hit = self.arena.terrain_along(*(p.prev_center + p.center))
+                    if all_terrain_hit:  # False if empty list
                         if p.on_terrain_f:
                             p.on_terrain_f(p)
-                        self.active_particles.remove(p)
-                        for i in all_terrain_hit_i:
-                            if i in range(0, len(self.arena.rects)):
-                                self.arena.rects[i].hits_to_destroy -= 1
-                                if self.arena.rects[i].hits_to_destroy == 0:
-                                    self.arena.rects.pop(i)
+                        self.remove_particle(p)
+                        for t in all_terrain_hit:  # just those, not others with the same coordinates
+                            _damage_terrain(t)
                     # Check Monsters
                     else:
-                        first_hit = p.collidelist(self.active_monsters)
+                        first_hit = p.collidelist(monsters)
                         if first_hit != -1:  # If hit a monsters
-                            p.on_hit(self.active_monsters[first_hit], self.game_time.msec)
-                            self.active_particles.remove(p)
+                            _hit_monster(p, first_hit)
+                            self.remove_particle(p)
                     # If didn't hit a monster, check player
                         else:
                             if p.colliderect(opposite):
-                                p.on_hit(opposite, self.game_time.msec)
-                                self.active_particles.remove(p)
+                                p.on_hit(opposite, now)
+                                self.remove_particle(p)
                 # Melee Particle
                 elif isinstance(p, MeleeParticle):
                     # Check Monsters
-                    all_monsters_hit_i = p.collidelistall(self.active_monsters)
-                    for i in all_monsters_hit_i:
-                        p.on_hit(self.active_monsters[i], self.game_time.msec)
+                    for i in p.collidelistall(monsters):
+                        _hit_monster(p, i)
 
-                    first_terrain_hit_i = p.collidelist(self.arena.rects)
+                    first_terrain_hit_i = p.collidelist(rects)
                     if first_terrain_hit_i != -1:
-                        self.arena.rects[first_terrain_hit_i].hits_to_destroy -= 1
-                        if self.arena.rects[first_terrain_hit_i].hits_to_destroy == 0:
-                            self.arena.rects.pop(first_terrain_hit_i)
+                        _damage_terrain(rects[first_terrain_hit_i])
                     # Check Player
                     if p.colliderect(opposite):
-                        p.on_hit(opposite, self.game_time.msec)
+                        p.on_hit(opposite, now)
                 # Field Particle
                 else:
-                    # Check Monsters and players
-                    for t in self.active_monsters + [self.player1, self.player2]:
+                    # Check Monsters and players; a hit only moves the
+                    # monster it hits, so finding them all first is the same
+                    for i in _monsters_in_field(p):
+                        _hit_monster(p, i)
+                    for t in (self.player1, self.player2):
                         if p.is_in_field(t):
-                            p.on_hit(t, self.game_time.msec)
+                            p.on_hit(t, now)
 
         _update_active_particles()
         _update_particles()
         _check_particle_collisions()
+        self.active_particles.compact()
 
     # -------------------------------------------------------------------------
     def handle_monsters(self, time):
@@ -417,15 +586,25 @@ class GameLoop:
     # -------------------------------------------------------------------------
     def draw_screen(self):
 
-        def _draw_ui1():
-            GL.SCREEN.blit(self.bg_image, (0, 0))
-            if self.arena.background is not None:
-                GL.SCREEN.blit(self.arena_image, (self.arena.play_area_rect.left, 0))
+        def _draw_static_layer():
+            # the backgrounds and terrain, composited again only when terrain
+            # comes or goes (or a restore brings back another arena)
+            arena = self.arena
+            if self.static_layer_arena is not arena or self.static_layer_version != arena.terrain_version:
+                self.static_layer.blit(self.bg_image, (0, 0))
+                if arena.background is not None:
+                    self.static_layer.blit(self.arena_image, (arena.play_area_rect.left, 0))
+                for rect in arena:
+                    if rect.color is not None:
+                        pygame.draw.rect(self.static_layer, rect.color, rect)
+                self.static_layer_arena, self.static_layer_version = arena, arena.terrain_version
+                self.dirty.add_all()
+            GL.SCREEN.blit(self.static_layer, (0, 0))
 
         def _draw_ui2():
             # health bars
-            GL.SCREEN.blit(self.health_bar_outline, (5, 20))
-            GL.SCREEN.blit(self.health_bar_outline2, (1239, 20))
+            health_outline1 = GL.SCREEN.blit(self.health_bar_outline, (5, 20))
+            health_outline2 = GL.SCREEN.blit(self.health_bar_outline2, (1239, 20))
 
             # dynamic health bars
             self.damage_taken1 = self.player1.hit_points_max - self.player1.hit_points
@@ -436,8 +615,8 @@ class GameLoop:
             pygame.draw.rect(GL.SCREEN, YELLOW, self.health_bar2)
 
             # energy bars
-            GL.SCREEN.blit(self.energy_bar_outline, (5, 280))
-            GL.SCREEN.blit(self.energy_bar_outline2, (1239, 280))
+            energy_outline1 = GL.SCREEN.blit(self.energy_bar_outline, (5, 280))
+            energy_outline2 = GL.SCREEN.blit(self.energy_bar_outline2, (1239, 280))
 
             # dynamic energy bars
             self.energy_used1 = 10 - self.player1.energy
@@ -447,7 +626,13 @@ class GameLoop:
             pygame.draw.rect(GL.SCREEN, GREEN, self.energy_bar1)
             pygame.draw.rect(GL.SCREEN, GREEN, self.energy_bar2)
 
+            self.dirty.changed('p1 bars', (self.player1.hit_points, self.player1.energy),
+                               health_outline1.unionall([self.health_bar1, energy_outline1, self.energy_bar1]))
+            self.dirty.changed('p2 bars', (self.player2.hit_points, self.player2.energy),
+                               health_outline2.unionall([self.health_bar2, energy_outline2, self.energy_bar2]))
+
             self.return_button.draw(GL.SCREEN)
+            self.dirty.add(self.return_button.rect)  # lights up under the mouse
 
         def _draw_ui_skill_boxes():
             skill_ids = self.player1.skills + self.player2.skills
@@ -465,13 +650,12 @@ class GameLoop:
 
                 if skill_ids[i] in ICONS_TABLE.keys():  # if icon picture exists
                     GL.SCREEN.blit(self.grey_bg, (skill_box.left, skill_box.top))
-                    GL.SCREEN.blit(ICONS_TABLE[skill_ids[i]], (skill_box.left, skill_box.top))
+                    GL.SCREEN.blit(ICONS_TABLE[skill_ids[i]].hud, (skill_box.left, skill_box.top))
 
                 else:  # if no icon picture exists
                     skill_text = str(SKILLS_TABLE[skill_ids[i]]['name'])
-                    skill_font = self.debug_font_small_2.render(skill_text, True, WHITE)
-                    skill_text_xy = font_position_center(skill_box, self.debug_font_small_2, skill_text)
-                    GL.SCREEN.blit(skill_font, skill_text_xy)
+                    skill_font, (dx, dy) = name_placeholder(self.debug_font_small_2, skill_text, skill_box.size)
+                    GL.SCREEN.blit(skill_font, (skill_box.left + dx, skill_box.top + dy))
 
                 if i < 5:
                     if self.player1.energy < SKILLS_TABLE[skill_ids[i]]['energy']:
@@ -484,7 +668,7 @@ class GameLoop:
             li = [('X', RED), ('B', BLUE), ('Y', BLUE), ('R1', BLUE), ('R2', DKYELLOW) ]
             li = li + li
             for i, skill_box in enumerate(self.skill_boxes):
-                font = self.debug_font.render(li[i][0], True, li[i][1])
+                font = TEXT_CACHE.render(self.debug_font, li[i][0], True, li[i][1])
                 xy_centered = font_position_center(self.skill_boxes[i], self.debug_font, li[i][0])
                 xy_new = xy_centered[0], xy_centered[1] - 30
                 GL.SCREEN.blit(font, xy_new)
@@ -502,14 +686,15 @@ class GameLoop:
             if GL.INPUT2.SKILL3:    GL.SCREEN.blit(self.white_mask, self.skill_boxes[8].topleft)
             if GL.INPUT2.ULT:       GL.SCREEN.blit(self.white_mask, self.skill_boxes[9].topleft)
 
-        def _draw_timer():
-            time_display = self.timer_font.render(str(self.game_time), True, BLUE)
-            GL.SCREEN.blit(time_display, self.timer_font_xy)
+            # the boxes show the loadout, what it can afford and what is held down
+            for p, inp, boxes in ((self.player1, GL.INPUT1, self.skill_boxes[:5]), (self.player2, GL.INPUT2, self.skill_boxes[5:])):
+                shown = p.skills, p.energy, (inp.ATTACK, inp.SKILL1, inp.SKILL2, inp.SKILL3, inp.ULT)
+                self.dirty.changed('p{} skills'.format(p.id), shown, Rect(boxes[0]).unionall(boxes[1:]).inflate(6, 6))
 
-        def _draw_arena():
-            for rect in self.arena:
-                if rect.color is not None:
-                    pygame.draw.rect(GL.SCREEN, rect.color, rect)
+        def _draw_timer():
+            text = str(self.game_time)
+            time_display = TEXT_CACHE.render(self.timer_font, text, True, BLUE)
+            self.dirty.changed('timer', text, GL.SCREEN.blit(time_display, self.timer_font_xy))
 
         def _draw_players():
             def _draw_player(p):
@@ -517,6 +702,8 @@ class GameLoop:
                 # wait_frames = frames waited before key is incremented
                 # animation_key = index for the sprite list
 
+                x, y = self.lerp_topleft(p)
+
                 # Draw player 1
                 if p.state != p.previous_state:
                     p.wait_frames = 0
@@ -532,9 +719,9 @@ class GameLoop:
                         if p.animation_key < 3:
                             p.animation_key += 1
                     if flip:
-                        GL.SCREEN.blit(pygame.transform.flip(p.sprite[p.animation_key + 70], flip, False), (p.left - 17 - 64, p.top - 22))
+                        p.sprite.blit(GL.SCREEN, p.animation_key + 70, flip, (x - 17 - 64, y - 22))
                     else:
-                        GL.SCREEN.blit(pygame.transform.flip(p.sprite[p.animation_key + 70], flip, False), (p.left - 17, p.top - 22))
+                        p.sprite.blit(GL.SCREEN, p.animation_key + 70, flip, (x - 17, y - 22))
 
                 # elif p.state = WIN:
 
@@ -560,7 +747,7 @@ class GameLoop:
                         if p.wait_frames <= 0:
                             p.wait_frames = 2
                             p.animation_key = (p.animation_key + 1) % 16
-                        GL.SCREEN.blit(pygame.transform.flip(p.sprite[p.animation_key + 8], flip, False), (p.left - 17, p.top - 22))
+                        p.sprite.blit(GL.SCREEN, p.animation_key + 8, flip, (x - 17, y - 22))
                     elif p.attack_state == 'none':
                         p.wait_frames = 1
                     else:
@@ -569,7 +756,7 @@ class GameLoop:
                             if p.animation_key < \
                                     PL_ATTACK_TABLE[p.attack_state][1]:
                                 p.animation_key += 1
-                        GL.SCREEN.blit(pygame.transform.flip(p.sprite[p.animation_key + PL_ATTACK_TABLE[p.attack_state][0]], flip, False), (p.left - 17, p.top - 22))
+                        p.sprite.blit(GL.SCREEN, p.animation_key + PL_ATTACK_TABLE[p.attack_state][0], flip, (x - 17, y - 22))
 
                 # JUMP
                 elif p.state == JUMP:
@@ -579,7 +766,7 @@ class GameLoop:
                         p.wait_frames = 5
                         if p.animation_key <= 0:
                             p.animation_key += 1
-                    GL.SCREEN.blit(pygame.transform.flip(p.sprite[p.animation_key + 24], flip, False), (p.left - 17, p.top - 22))
+                    p.sprite.blit(GL.SCREEN, p.animation_key + 24, flip, (x - 17, y - 22))
 
                 # FALL
                 elif p.state == FALL:
@@ -589,7 +776,7 @@ class GameLoop:
                         p.wait_frames = 5
                         if p.animation_key <= 0:
                             p.animation_key += 1
-                    GL.SCREEN.blit(pygame.transform.flip(p.sprite[p.animation_key + 26], flip, False), (p.left - 17, p.top - 22))
+                    p.sprite.blit(GL.SCREEN, p.animation_key + 26, flip, (x - 17, y - 22))
 
                 # WALK
                 elif p.state == RWALK or p.state == LWALK:
@@ -604,15 +791,16 @@ class GameLoop:
                         p.animation_key += 1
                         if p.animation_key > 0:
                             p.animation_key %= 16  # Loops the key
-                    GL.SCREEN.blit(pygame.transform.flip(p.sprite[p.animation_key + 8], flip, False), (p.left - 17, p.top - 22))
+                    p.sprite.blit(GL.SCREEN, p.animation_key + 8, flip, (x - 17, y - 22))
 
                 # STAND (default animation)
                 else:
                     if p.facing_direction == LEFT:
                         flip = True
                     # Currently only have 1 standing sprite
-                    GL.SCREEN.blit(pygame.transform.flip(p.sprite[p.animation_key + 1], flip, False), (p.left - 17, p.top - 22))
-                p.wait_frames += -1
+                    p.sprite.blit(GL.SCREEN, p.animation_key + 1, flip, (x - 17, y - 22))
+                p.wait_frames += -self.steps_since_draw  # animations run at the simulation rate
+                self.dirty.add(Rect(x - 81, y - 22, 192, 64))  # fits a death frame (128 wide) facing either way
 
             if self.player1.sprite is not None:
                 _draw_player(self.player1)
@@ -630,69 +818,71 @@ class GameLoop:
                     v3 = (p.centerx + 10, 30)
                     vlist = [v1, v2, v3]
 
-                    GL.SCREEN.blit(self.oor_font.render(text, True, color), (p.centerx - 20, 40))
-                    GL.SCREEN.blit(self.st_dmg_font.render(text2, True, color), (p.centerx + 10, 40))
-                    pygame.draw.polygon(GL.SCREEN, color, vlist)
+                    self.dirty.add(GL.SCREEN.blit(TEXT_CACHE.render(self.oor_font, text, True, color), (p.centerx - 20, 40)))
+                    self.dirty.add(GL.SCREEN.blit(TEXT_CACHE.render(self.st_dmg_font, text2, True, color), (p.centerx + 10, 40)))
+                    self.dirty.add(pygame.draw.polygon(GL.SCREEN, color, vlist))
 
         def _draw_monsters():
             for m in self.active_monsters:
+                x, y = self.lerp_topleft(m)
                 if m.kind == WEAK:
-                    GL.SCREEN.blit(self.weak_monster_image, m.topleft)
+                    self.dirty.add(GL.SCREEN.blit(self.weak_monster_image, (x, y)))
                 elif m.kind == MEDIUM:
-                    GL.SCREEN.blit(self.medium_monster_image, m.topleft)
+                    self.dirty.add(GL.SCREEN.blit(self.medium_monster_image, (x, y)))
                 elif m.kind == ULTIMATE:
-                    GL.SCREEN.blit(self.ultimate_monster_image, m.topleft)
-                health_bar = Rect2(left=m.left, top=m.top - 8, width=m.width, height=6)
+                    self.dirty.add(GL.SCREEN.blit(self.ultimate_monster_image, (x, y)))
+                health_bar = Rect2(left=x, top=y - 8, width=m.width, height=6)
                 health_bar_width = round(m.width * (m.hit_points / m.hit_points_max))
-                health_bar_life = Rect2(left=m.left, top=m.top - 8, width=health_bar_width, height=6)
+                health_bar_life = Rect2(left=x, top=y - 8, width=health_bar_width, height=6)
 
-                pygame.draw.rect(GL.SCREEN, WHITE, health_bar)
+                self.dirty.add(pygame.draw.rect(GL.SCREEN, WHITE, health_bar))
                 pygame.draw.rect(GL.SCREEN, RED, health_bar_life)
                 pygame.draw.rect(GL.SCREEN, BLACK, health_bar, 1)
 
         def _draw_dropped_skills():
             for skill in self.arena.dropped_skills:
-                pygame.draw.rect(GL.SCREEN, skill.color, skill)
+                self.dirty.add(pygame.draw.rect(GL.SCREEN, skill.color, skill))
                 if skill.id not in ICONS_TABLE.keys():
-                    skill_text = str(skill.id)
-                    skill_font = self.debug_font_small_2.render(skill_text, True, WHITE)
-                    skill_text_xy = font_position_center(skill, self.debug_font_small_2, skill_text)
-                    GL.SCREEN.blit(skill_font, skill_text_xy)
+                    skill_font, (dx, dy) = name_placeholder(self.debug_font_small_2, str(skill.id), skill.size)
+                    GL.SCREEN.blit(skill_font, (skill.left + dx, skill.top + dy))
                 else:
-                    icon = ICONS_TABLE[skill.id]
-                    icon = image_scale(icon, (20, 20))
-                    GL.SCREEN.blit(icon, (skill[0] + 2.5, skill[1] + 2.5))
+                    GL.SCREEN.blit(ICONS_TABLE[skill.id].ground, (skill[0] + 2.5, skill[1] + 2.5))
 
         def _draw_particles():
+            drawn, budget = 0, self.particle_budget
             for p in self.active_particles:
+                if drawn >= PARTICLE_DRAW_LIMIT and budget.category(p) == 'swarm':
+                    budget.counters['not_drawn'] += 1
+                    continue
+                drawn += 1
+                x, y = self.lerp_topleft(p)
                 if isinstance(p, FieldParticle):
-                    pygame.draw.circle(GL.SCREEN, p.color, (p.centerx, p.centery), p.radius, 1)
+                    self.dirty.add(pygame.draw.circle(GL.SCREEN, p.color, (x + p.width // 2, y + p.height // 2), p.radius, 1))
                 else:
                     # If icon art exists
                     if p.sid in PARTICLES_TABLE.keys():
-                        pimg = PARTICLES_TABLE[p.sid]
-                        if p.direction == LEFT:
-                            pimg = pygame.transform.flip(pimg, True, False)
+                        flip = p.direction == LEFT
 
                         # melee rotate
                         if isinstance(p, MeleeParticle):
-                            if p.direction == LEFT:
-                                pimg = pygame.transform.rotate(pimg, math.degrees(-1 * p.progress))
-                            else:
-                                pimg = pygame.transform.rotate(pimg, math.degrees(p.progress))
+                            pimg = self.rotations.get(p.sid, flip, math.degrees(-p.progress if flip else p.progress))
 
                         # Special rotate cases
-                        elif p.sid in [5, 112, 123, 125, 'beehive']:
+                        elif p.sid in ROTATING_PARTICLES:
                             if 'rotator' not in p.__dict__.keys():
                                 p.rotator = 0
                             else:
-                                p.rotator += 10
-                            pimg = pygame.transform.rotate(pimg, p.rotator)
-                        GL.SCREEN.blit(pimg, (p.left, p.top))
+                                p.rotator += 10 * self.steps_since_draw
+                            pimg = self.rotations.get(p.sid, flip, p.rotator)
+                        elif flip:
+                            pimg = self.rotations.get(p.sid, flip, 0)
+                        else:
+                            pimg = PARTICLES_TABLE[p.sid]
+                        self.dirty.add(GL.SCREEN.blit(pimg, (x, y)))
 
                     # no particle
                     else:
-                        pygame.draw.rect(GL.SCREEN, p.color, p)
+                        self.dirty.add(pygame.draw.rect(GL.SCREEN, p.color, ((x, y), p.size)))
 
         def _draw_scrolling_text():
             for unit in self.active_monsters + [self.player1, self.player2]:
@@ -706,26 +896,26 @@ class GameLoop:
                         text = '-' + str(int(t[1]))
                         color = RED
 
-                        GL.SCREEN.blit(self.st_dmg_font.render(text, True, color),
-                                       (unit.centerx + 30, unit.top - (3000 - t[2] + self.game_time.msec) / 50))
+                        self.dirty.add(GL.SCREEN.blit(TEXT_CACHE.render(self.st_dmg_font, text, True, color),
+                                                      (unit.centerx + 30, unit.top - (3000 - t[2] + self.game_time.msec) / 50)))
                     # Health Gain text
                     elif t[0] == ST_HP:
                         text = '+' + str(int(t[1]))
                         color = GREEN
-                        GL.SCREEN.blit(self.st_dmg_font.render(text, True, color),
-                                       (unit.centerx + 30, unit.top - (3000 - t[2] + self.game_time.msec) / 50))
+                        self.dirty.add(GL.SCREEN.blit(TEXT_CACHE.render(self.st_dmg_font, text, True, color),
+                                                      (unit.centerx + 30, unit.top - (3000 - t[2] + self.game_time.msec) / 50)))
                     # Level up scrolling text
                     elif t[0] == ST_LEVEL_UP:
                         text = t[1]
                         color = YELLOW
-                        GL.SCREEN.blit(self.st_level_up_font.render(text, True, color),
-                                       (unit.centerx - 50, unit.top - (4000 - t[2] + self.game_time.msec) / 50))
+                        self.dirty.add(GL.SCREEN.blit(TEXT_CACHE.render(self.st_level_up_font, text, True, color),
+                                                      (unit.centerx - 50, unit.top - (4000 - t[2] + self.game_time.msec) / 50)))
                     # Energy gain text
                     elif t[0] == ST_ENERGY:
                         text = str(t[1])
                         color = PURPLE
-                        GL.SCREEN.blit(self.st_energy_font.render(text, True, color),
-                                       (unit.centerx, unit.top - (3000 - t[2] + self.game_time.msec) / 50))
+                        self.dirty.add(GL.SCREEN.blit(TEXT_CACHE.render(self.st_energy_font, text, True, color),
+                                                      (unit.centerx, unit.top - (3000 - t[2] + self.game_time.msec) / 50)))
                     if t[2] <= self.game_time.msec:
                         unit.st_buffer.remove(t)
 
@@ -750,7 +940,8 @@ class GameLoop:
                             print_list.append((color, k + ':' + str(max_duration)))
                 # Print list
                 for i, v in enumerate(print_list):
-                    GL.SCREEN.blit(self.st_condition_font.render(v[1], True, v[0]), (unit.centerx - 70, unit.top - 20 - (15 * i)))
+                    self.dirty.add(GL.SCREEN.blit(TEXT_CACHE.render(self.st_condition_font, v[1], True, v[0]),
+                                                  (unit.centerx - 70, unit.top - 20 - (15 * i))))
 
         def _draw_rain():
             if self.make_rain:
@@ -768,13 +959,13 @@ class GameLoop:
                     self.rain_particles.remove(r)
             self.make_rain = False
 
-        _draw_ui1()
+        self.dirty.begin()
+        _draw_static_layer()
         _draw_ui2()
         _draw_ui_skill_boxes()
         _draw_ui_controls()
         _draw_ui_controls2()
         _draw_timer()
-        _draw_arena()
         _draw_dropped_skills()
         _draw_monsters()
         if not GL.INPUT1.DEBUG_MODE_ON:
@@ -803,10 +994,10 @@ class GameLoop:
             y = '| y:{:>8.2f}|'.format(self.player1.y)
             dx = '|dx:{:>8.2f}|'.format(self.player1.dx)
             dy = '|dy:{:>8.2f}|'.format(self.player1.dy)
-            debug_font_1 = self.debug_font.render(x, True, GREEN)
-            debug_font_2 = self.debug_font.render(y, True, GREEN)
-            debug_font_3 = self.debug_font.render(dx, True, GREEN)
-            debug_font_4 = self.debug_font.render(dy, True, GREEN)
+            debug_font_1 = TEXT_CACHE.render(self.debug_font, x, True, GREEN)
+            debug_font_2 = TEXT_CACHE.render(self.debug_font, y, True, GREEN)
+            debug_font_3 = TEXT_CACHE.render(self.debug_font, dx, True, GREEN)
+            debug_font_4 = TEXT_CACHE.render(self.debug_font, dy, True, GREEN)
             GL.SCREEN.blit(debug_font_1, self.debug_font_xy1)
             GL.SCREEN.blit(debug_font_2, self.debug_font_xy2)
             GL.SCREEN.blit(debug_font_3, self.debug_font_xy3)
@@ -814,19 +1005,55 @@ class GameLoop:
 
             num_monsters = '|curr num monsters:{:>4}|'.format(len(self.active_monsters))
             max_monsters = '| max num monsters:{:>4}|'.format(self.arena.max_monsters)
-            debug_font_m1 = self.debug_font.render(num_monsters, True, GREEN)
-            debug_font_m2 = self.debug_font.render(max_monsters, True, GREEN)
+            debug_font_m1 = TEXT_CACHE.render(self.debug_font, num_monsters, True, GREEN)
+            debug_font_m2 = TEXT_CACHE.render(self.debug_font, max_monsters, True, GREEN)
             GL.SCREEN.blit(debug_font_m1, self.debug_font_xy5)
             GL.SCREEN.blit(debug_font_m2, self.debug_font_xy6)
 
         def _draw_cpu_usage():
             cpu_text = '|CPU Utilization:{:>5.1f}%|'.format(self.cpu_avg) if psutil_found else '|CPU Utilization:  ????|'
-            cpu_font = self.debug_font.render(cpu_text, True, RED)
+            cpu_font = TEXT_CACHE.render(self.debug_font, cpu_text, True, RED)
             GL.SCREEN.blit(cpu_font, self.debug_font_xy7)
 
+        def _draw_frame_profiler():
+            prof = self.profiler
+            left, top = self.arena.play_area_rect.left + 5, 5
+            GL.SCREEN.blit(self.profiler_panel, (left, top))
+            lines = [(WHITE, 'frame {:>6.2f} ms  p99 {:>6.2f} ms  budget {:.1f}'.format(
+                prof.mean(prof.frame_ms), prof.p99(), SIM_STEP_MSEC))]
+            for stage in prof.STAGES:
+                lines.append((GREEN, '  {:<10}{:>7.2f} ms'.format(stage, prof.mean(prof.stage_ms[stage]))))
+            lines.append((ORANGE, '  {:<10}{:>7.2f} ms  max {:.2f}'.format(
+                'gc', prof.mean(prof.gc_ms), max(prof.gc_ms) if prof.gc_ms else 0.0)))
+
+            monsters = collections.Counter(str(m.kind) for m in self.active_monsters)
+            particles = collections.Counter(type(p).__name__.replace('Particle', '') for p in self.active_particles)
+            lines.append((WHITE, 'monsters {:>3}  {}'.format(len(self.active_monsters), ' '.join(
+                '{}:{}'.format(k, v) for k, v in sorted(monsters.items())))))
+            lines.append((WHITE, 'particles {:>3}  {}'.format(len(self.active_particles), ' '.join(
+                '{}:{}'.format(k, v) for k, v in sorted(particles.items())))))
+            lines.append((WHITE, 'terrain {:>3}  dropped skills {:>3}'.format(
+                len(self.arena.rects), len(self.arena.dropped_skills))))
+            lines.append((ORANGE, 'budget  merged {merged}  dropped {dropped}  not drawn {not_drawn}'.format_map(
+                self.particle_budget.counters)))
+            lines.append((ORANGE, 'text cache  hits {}  misses {}  kept {}'.format(
+                TEXT_CACHE.hits, TEXT_CACHE.misses, len(TEXT_CACHE.surfaces))))
+            for i, (color, text) in enumerate(lines):
+                GL.SCREEN.blit(TEXT_CACHE.render(self.debug_font_small, text, True, color), (left + 5, top + 3 + 14 * i))
+
+            # frame time graph, newest on the right; the line is the sim step budget
+            graph_bottom, graph_height = top + 258, 60
+            scale = graph_height / (2 * SIM_STEP_MSEC)
+            for i, ms in enumerate(prof.frame_ms):
+                color = RED if ms > SIM_STEP_MSEC else GREEN
+                x = left + 5 + i * 320 // prof.frame_ms.maxlen
+                pygame.draw.line(GL.SCREEN, color, (x, graph_bottom), (x, graph_bottom - min(graph_height, ms * scale)))
+            budget_y = graph_bottom - SIM_STEP_MSEC * scale
+            pygame.draw.line(GL.SCREEN, YELLOW, (left + 5, budget_y), (left + 325, budget_y))
+
         def _draw_destructible_terrain_debug_text():
             for rect in self.arena.destructible_terrain:
-                rendered_debug_font = self.debug_font_small_2.render(str(rect.hits_to_destroy), True, BLACK)
+                rendered_debug_font = TEXT_CACHE.render(self.debug_font_small_2, str(rect.hits_to_destroy), True, BLACK)
                 pos = font_position_center(rect, self.debug_font_small_2, str(rect.hits_to_destroy))
                 GL.SCREEN.blit(rendered_debug_font, pos)
 
@@ -836,15 +1063,15 @@ class GameLoop:
             pygame.draw.circle(GL.SCREEN, WHITE, mouse_pos, 2, 0)
             pygame.draw.circle(GL.SCREEN, BLACK, mouse_pos, 2, 1)
             if 0 <= play_area_mouse_pos[0] <= self.arena.play_area_rect.width and 0 <= play_area_mouse_pos[1] <= self.arena.play_area_rect.height:
-                offset_pos_mouse_font = self.debug_font_small.render(str(play_area_mouse_pos), True, DGREY)
+                offset_pos_mouse_font = TEXT_CACHE.render(self.debug_font_small, str(play_area_mouse_pos), True, DGREY)
                 GL.SCREEN.blit(offset_pos_mouse_font, mouse_pos)
-            real_pos_mouse_font = self.debug_font_small.render(str(mouse_pos), True, DKYELLOW)
+            real_pos_mouse_font = TEXT_CACHE.render(self.debug_font_small, str(mouse_pos), True, DKYELLOW)
             GL.SCREEN.blit(real_pos_mouse_font, (mouse_pos[0] + 3, mouse_pos[1] + 10))
 
         def _draw_players_debug(draw_p1=True, draw_p2=True):
 
             def _draw_player_debug(p, c1, c2):
-                pygame.draw.rect(GL.SCREEN, c1, p)
+                self.dirty.add(pygame.draw.rect(GL.SCREEN, c1, p))
                 eye = Rect2(topleft=p.topleft, size=(5, 5))
                 if p.facing_direction == LEFT:
                     eye.topleft = p.topleft
@@ -876,11 +1103,17 @@ class GameLoop:
                 for l in locs:
                     pygame.draw.circle(GL.SCREEN, ORANGE, l, 3, 0)
 
+        if GL.INPUT1.DEBUG_MODE_ON != self.debug_mode_shown:
+            self.dirty.add_all()  # turned off, the overlays have to come off the display too
+            self.debug_mode_shown = GL.INPUT1.DEBUG_MODE_ON
+
         if GL.INPUT1.DEBUG_MODE_ON:
+            self.dirty.add_all()  # it draws all over
             _draw_spawn_point_rects()
             _draw_play_area_debug_border()
             _draw_debug_text()
             _draw_cpu_usage()
+            _draw_frame_profiler()
             _draw_destructible_terrain_debug_text()
             _draw_players_debug()
             _draw_player_collision_points_for_debugging()
@@ -891,6 +1124,62 @@ class GameLoop:
             if self.player2.sprite is None:
                 _draw_players_debug(draw_p1=False, draw_p2=True)
 
+    # -------------------------------------------------------------------------
+    def on_time_tick(self):
+        self.game_time.inc()
+
+        # for CPU usage debug text
+        if psutil_found and GL.INPUT1.DEBUG_MODE_ON:
+            new_cpu = psutil.cpu_percent(interval=None)
+            self.cpu_deque.append(new_cpu)
+            self.cpu_avg = sum(self.cpu_deque) / len(self.cpu_deque)
+
+        # Player 1 conditions
+        for k, v in self.player1.conditions.items():
+            for e in v:
+                if e.is_expired(self.game_time.msec):
+                    self.player1.conditions[k].remove(e)
+
+        # Player 2 conditions
+        for k, v in self.player2.conditions.items():
+            for e in v:
+                if e.is_expired(self.game_time.msec):
+                    self.player2.conditions[k].remove(e)
+
+        # Monster conditions
+        for m in self.active_monsters:
+            for k, v in m.conditions.items():
+                for e in v:
+                    if e.is_expired(self.game_time.msec):
+                        m.conditions[k].remove(e)
+
+    def on_regeneration(self):
+        for p in (self.player1, self.player2):
+            if p.hit_points > 0:
+                if p.conditions[WOUNDED] and not p.conditions[INVIGORATED]:
+                    p.hit_points += p.level / 20
+                elif not p.conditions[WOUNDED] and p.conditions[INVIGORATED]:
+                    p.hit_points += p.level / 5
+                else:
+                    p.hit_points += p.level / 10
+                if p.hit_points > 100:
+                    p.hit_points = 100
+
+                if p.conditions[WEAKENED] and not p.conditions[EMPOWERED]:
+                    p.energy += p.level / 10
+                elif not p.conditions[WEAKENED] and p.conditions[EMPOWERED]:
+                    p.energy += p.level / 2.5
+                else:
+                    p.energy += p.level / 5
+                if p.energy > 10:
+                    p.energy = 10
+
+    def on_more_rain(self):
+        self.make_rain = True
+
+    def on_monster_spawn(self):
+        self.spawn_monsters = True
+
     # -------------------------------------------------------------------------
     def handle_event_queue(self):
 
@@ -901,130 +1190,21 @@ class GameLoop:
                     AUDIO.play_next_random_song()
 
         def _handle_return_to_main_menu_from_click():
+            if HEADLESS:  # no button to click; just drop whatever is left
+                pygame.event.clear()
+                return
             for event in pygame.event.get():
                 if 'click' in self.return_button.handleEvent(event):
                     self.return_now = True
                     GL.NEXT_PAGE = '_start'
 
-        def _handle_time_tick_event():
-            for event in pygame.event.get(TIME_TICK_EVENT):
-                if event.type == TIME_TICK_EVENT:
-                    self.game_time.inc()
-
-                    # for CPU usage debug text
-                    if psutil_found and GL.INPUT1.DEBUG_MODE_ON:
-                        new_cpu = psutil.cpu_percent(interval=None)
-                        self.cpu_deque.append(new_cpu)
-                        self.cpu_avg = sum(self.cpu_deque) / len(self.cpu_deque)
-
-                    # Player 1 conditions
-                    for k, v in self.player1.conditions.items():
-                        for e in v:
-                            if e.is_expired(self.game_time.msec):
-                                self.player1.conditions[k].remove(e)
-
-                    # Player 2 conditions
-                    for k, v in self.player2.conditions.items():
-                        for e in v:
-                            if e.is_expired(self.game_time.msec):
-                                self.player2.conditions[k].remove(e)
-
-                    # Monster conditions
-                    for m in self.active_monsters:
-                        for k, v in m.conditions.items():
-                            for e in v:
-                                if e.is_expired(self.game_time.msec):
-                                    m.conditions[k].remove(e)
-
-        def _handle_regeneration_event():
-            for event in pygame.event.get(REGENERATION_EVENT):
-                if event.type == REGENERATION_EVENT:
-                    # Player 1
-                    if self.player1.hit_points > 0:
-                        if self.player1.conditions[WOUNDED] and not self.player1.conditions[INVIGORATED]:
-                            self.player1.hit_points += self.player1.level / 20
-                        elif not self.player1.conditions[WOUNDED] and self.player1.conditions[INVIGORATED]:
-                            self.player1.hit_points += self.player1.level / 5
-                        else:
-                            self.player1.hit_points += self.player1.level / 10
-                        if self.player1.hit_points > 100:
-                            self.player1.hit_points = 100
-
-                        if self.player1.conditions[WEAKENED] and not self.player1.conditions[EMPOWERED]:
-                            self.player1.energy += self.player1.level / 10
-                        elif not self.player1.conditions[WEAKENED] and self.player1.conditions[EMPOWERED]:
-                            self.player1.energy += self.player1.level / 2.5
-                        else:
-                            self.player1.energy += self.player1.level / 5
-                        if self.player1.energy > 10:
-                            self.player1.energy = 10
-                    # Player 2
-                    if self.player2.hit_points > 0:
-                        if self.player2.conditions[WOUNDED] and not self.player2.conditions[INVIGORATED]:
-                            self.player2.hit_points += self.player2.level / 20
-                        elif not self.player2.conditions[WOUNDED] and self.player2.conditions[INVIGORATED]:
-                            self.player2.hit_points += self.player2.level / 5
-                        else:
-                            self.player2.hit_points += self.player2.level / 10
-                        if self.player2.hit_points > 100:
-                            self.player2.hit_points = 100
-
-                        if self.player2.conditions[WEAKENED] and not self.player2.conditions[EMPOWERED]:
-                            self.player2.energy += self.player2.level / 10
-                        elif not self.player2.conditions[WEAKENED] and self.player2.conditions[EMPOWERED]:
-                            self.player2.energy += self.player2.level / 2.5
-                        else:
-                            self.player2.energy += self.player2.level / 5
-                        if self.player2.energy > 10:
-                            self.player2.energy = 10
-
-        def _handle_player_lock_events():
-            # player 1 skill lock timer
-            for event in pygame.event.get(PLAYER1_LOCK_EVENT):
-                if event.type == PLAYER1_LOCK_EVENT:
-                    self.player1.attack_cooldown_expired = True
-                    pygame.time.set_timer(PLAYER1_LOCK_EVENT, 0)
-            # player 2 skill lock timer
-            for event in pygame.event.get(PLAYER2_LOCK_EVENT):
-                if event.type == PLAYER2_LOCK_EVENT:
-                    self.player2.attack_cooldown_expired = True
-                    pygame.time.set_timer(PLAYER2_LOCK_EVENT, 0)
-
-        def _handle_player_pickup_skill_events():
-            for event in pygame.event.get(PLAYER1_PICKUP_EVENT):
-                if event.type == PLAYER1_PICKUP_EVENT:
-                    self.player1.pickup_time += 1
-                    pygame.time.set_timer(PLAYER1_PICKUP_EVENT, 0)
-
-            for event in pygame.event.get(PLAYER2_PICKUP_EVENT):
-                if event.type == PLAYER2_PICKUP_EVENT:
-                    self.player2.pickup_time += 1
-                    pygame.time.set_timer(PLAYER2_PICKUP_EVENT, 0)
-
-        def _handle_rain_event():
-            for event in pygame.event.get(MORE_RAIN_EVENT):
-                if event.type == MORE_RAIN_EVENT:
-                    self.make_rain = True
-                    pygame.time.set_timer(MORE_RAIN_EVENT, 150)
-
-        def _handle_monster_spawn_event():
-            for event in pygame.event.get(MONSTER_SPAWN_EVENT):
-                if event.type == MONSTER_SPAWN_EVENT:
-                    self.spawn_monsters = True
-                    pygame.time.set_timer(MONSTER_SPAWN_EVENT, 10000)
-
         def _handle_quit_event():
             for event in pygame.event.get(QUIT):
                 if event.type == QUIT:
                     EXIT_GAME()
 
         _handle_song_end_event()
-        _handle_time_tick_event()
-        _handle_regeneration_event()
-        _handle_player_lock_events()
-        _handle_player_pickup_skill_events()
-        _handle_rain_event()
-        _handle_monster_spawn_event()
+        self.scheduler.advance()
         _handle_quit_event()
         _handle_return_to_main_menu_from_click()
 
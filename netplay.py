@@ -0,0 +1,312 @@
+"""
+Two-player netplay over UDP with rollback.
+
+Each machine runs the whole simulation.  Only inputs go over the network:
+every packet carries this side's packed inputs (see classes.pack_input) that
+the other side hasn't acknowledged yet, so a lost packet is covered by the
+next one.  When the remote player's input for a frame hasn't arrived, it is
+predicted to be the same as their last known one, and the frame is run
+anyway.  If the real input turns out different, the game is restored from
+the newest snapshot taken at or before that frame (see GameLoop.snapshot)
+and every frame since is run again.
+
+To catch the two simulations drifting apart anyway, every DIGEST_INTERVAL
+frames each side takes a state digest (see GameLoop.state_digest) and, once
+no rollback can change it any more, repeats it in every packet; a side whose
+own digest for that frame differs reports the desync.
+
+The host is player 1 and picks the RNG seed and arena; whoever joins is
+player 2.  Both sides use their own keyboard/gamepad as INPUT1.
+
+Usage:
+    python netplay.py host <port>
+    python netplay.py join <host>:<port>
+
+Add --headless --frames N --bot SEED to either side to play N frames with
+random buttons and no window, as fast as the two can keep in step; both print
+the same state digest at the end if they stayed in sync (and say so if not).
+"""
+
+# python standard library modules
+import os
+import socket
+import struct
+import sys
+import time
+
+if '--headless' in sys.argv:
+    os.environ['FAMISHED_HEADLESS'] = '1'  # must be set before globals is imported
+
+# our modules
+from main import *
+
+INPUT_DELAY = 2  # frames between pressing a button and it taking effect; hides a little latency
+MAX_ROLLBACK = 8  # frames we may run ahead of the last confirmed remote input
+MAX_INPUTS_PER_PACKET = 64
+CONNECTION_TIMEOUT = 10  # seconds without hearing from the other side
+DIGEST_INTERVAL = SIM_FPS  # frames between state digests the two sides compare
+
+HELLO = b'H'
+START = b'S'
+INPUTS = b'I'
+INPUTS_HEADER = struct.Struct('<cIIHII')  # type, ack (next frame wanted), first frame, count, digest frame, digest
+
+
+# ----------------------------------------------------------------------------
+class RollbackSession:
+    def __init__(self, game, sock, remote_addr, local_id, local_source, start_packet=None):
+        """local_source is f() -> packed input bits for this machine's player;
+        the host passes its START packet to resend if the first one is lost"""
+        self.game = game
+        self.sock = sock
+        self.remote_addr = remote_addr
+        self.start_packet = start_packet
+        self.local_source = local_source
+        self.local_input = PackedInput(local_id)
+        self.remote_input = PackedInput(3 - local_id)
+        if local_id == 1:
+            GL.INPUT1, GL.INPUT2 = self.local_input, self.remote_input
+        else:
+            GL.INPUT1, GL.INPUT2 = self.remote_input, self.local_input
+
+        self.frame = 0  # next frame to simulate
+        self.local_inputs = {f: 0 for f in range(INPUT_DELAY)}  # nothing is pressed before the delay runs out
+        self.remote_inputs = dict(self.local_inputs)  # confirmed
+        self.predicted = {}  # frame -> remote bits we guessed and ran with
+        self.confirmed = INPUT_DELAY - 1  # every remote input up to here is in remote_inputs
+        self.remote_ack = 0  # the other side has all our inputs before this frame
+        self.snapshots = {}  # frame -> state before running it, for frames a rollback may go back to
+        self.rollback_to = None
+        self.rollbacks = 0
+        self.digests = {}  # digest frame -> state_digest() from before running it
+        self.final_digests = {}  # those no rollback can change any more
+        self.sent_digest = (0, 0)  # newest of final_digests as (frame, digest); frame 0 is none yet
+        self.remote_digest = (0, 0)  # newest one they sent
+        self.desync_frame = None
+        self.last_heard = time.perf_counter()
+
+    # ------------------------------------------------------------------------
+    def poll(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(4096)
+            except (BlockingIOError, socket.timeout):
+                return
+            if addr != self.remote_addr:
+                continue
+            self.last_heard = time.perf_counter()
+            if data[:1] == HELLO and self.start_packet:  # they missed our START; say it again
+                self.sock.sendto(self.start_packet, addr)
+            elif data[:1] == INPUTS:
+                self._receive_inputs(data)
+
+    def _receive_inputs(self, data):
+        _, ack, first, count, digest_frame, digest = INPUTS_HEADER.unpack_from(data)
+        self.remote_ack = max(self.remote_ack, ack)
+        if digest_frame > self.remote_digest[0]:
+            self.remote_digest = digest_frame, digest
+        bits = struct.unpack_from('<{}H'.format(count), data, INPUTS_HEADER.size)
+        for f, b in enumerate(bits, first):
+            if f in self.remote_inputs:
+                continue
+            self.remote_inputs[f] = b
+            guess = self.predicted.pop(f, None)
+            if guess is not None and guess != b and (self.rollback_to is None or f < self.rollback_to):
+                self.rollback_to = f
+        while self.confirmed + 1 in self.remote_inputs:
+            self.confirmed += 1
+
+    def send(self):
+        first = max(self.remote_ack, self.frame + INPUT_DELAY - MAX_INPUTS_PER_PACKET + 1)
+        last = max(f for f in self.local_inputs)
+        bits = [self.local_inputs[f] for f in range(first, last + 1)]
+        packet = INPUTS_HEADER.pack(INPUTS, self.confirmed + 1, first, len(bits), *self.sent_digest)
+        self.sock.sendto(packet + struct.pack('<{}H'.format(len(bits)), *bits), self.remote_addr)
+
+    # ------------------------------------------------------------------------
+    def simulate(self, frame, snapshot=True):
+        """runs frame, first taking a snapshot to roll back to if snapshot
+        and the remote input for it isn't confirmed yet"""
+        if snapshot and frame > self.confirmed:
+            self.snapshots[frame] = self.game.snapshot()
+        # a rollback goes back to a frame after confirmed, so of the frames
+        # up to confirmed + 1 only the newest snapshot can still be needed
+        for f in sorted(f for f in self.snapshots if f <= self.confirmed + 1)[:-1]:
+            del self.snapshots[f]
+        if frame and frame % DIGEST_INTERVAL == 0:
+            self.digests[frame] = self.game.state_digest()  # a rollback past frame takes it again
+        remote = self.remote_inputs.get(frame)
+        if remote is None:
+            remote = self.predicted[frame] = self.remote_inputs[self.confirmed]
+        self.local_input.set_bits(self.local_inputs[frame])
+        self.remote_input.set_bits(remote)
+        self.game.step()
+
+    def rollback(self):
+        """runs again from the newest snapshot at or before rollback_to.
+        A snapshot costs about half a step, so the frames run again only
+        keep the one at confirmed + 1, the earliest a later rollback can go
+        back to; the ones after it were taken on the wrong inputs and go"""
+        if self.rollback_to is not None and self.rollback_to < self.frame:
+            start = max(f for f in self.snapshots if f <= self.rollback_to)
+            self.game.restore(self.snapshots[start])
+            for f in [f for f in self.snapshots if f > start]:
+                del self.snapshots[f]
+            for f in range(start, self.frame):
+                self.simulate(f, snapshot=(f != start and f == self.confirmed + 1))
+            self.rollbacks += 1
+        self.rollback_to = None
+
+    def check_digests(self):
+        """call right after rollback(): finalizes the digests of frames whose
+        inputs are all confirmed and compares the other side's newest one"""
+        for f in sorted(self.digests):
+            if f >= self.frame or f - 1 > self.confirmed:
+                break
+            self.final_digests[f] = self.digests.pop(f)
+            self.sent_digest = f, self.final_digests[f]
+        f, digest = self.remote_digest
+        if f in self.final_digests:
+            if self.final_digests[f] != digest and self.desync_frame is None:
+                self.desync_frame = f
+                print('desync: the two sides were out of step by frame {}'.format(f))
+            for old in [old for old in self.final_digests if old <= f]:
+                del self.final_digests[old]
+
+    def tick(self):
+        """runs the next frame if we are not too far ahead of the other
+        side; returns whether it did"""
+        self.poll()
+        self.rollback()
+        self.check_digests()
+        if time.perf_counter() - self.last_heard > CONNECTION_TIMEOUT:
+            raise ConnectionError('lost connection to {}:{}'.format(*self.remote_addr))
+        if self.frame - self.confirmed > MAX_ROLLBACK or (self.game.return_now and self.frame - 1 > self.confirmed):
+            self.send()  # wait for them to catch up (or to confirm the game over)
+            return False
+        self.local_inputs[self.frame + INPUT_DELAY] = self.local_source()
+        self.send()
+        self.simulate(self.frame)
+        self.frame += 1
+        return True
+
+    @property
+    def game_over(self):
+        return self.game.return_now and self.frame - 1 <= self.confirmed
+
+    def finish(self, linger=0.5):
+        """keeps trading packets until both sides have every input, so both
+        end on the same frame, then a little longer in case our last ack got
+        lost"""
+        done_at = None
+        while done_at is None or time.perf_counter() - done_at < linger:
+            self.poll()
+            self.rollback()
+            self.check_digests()
+            self.send()
+            if done_at is None and self.confirmed >= self.frame - 1 and self.remote_ack >= self.frame + INPUT_DELAY:
+                done_at = time.perf_counter()
+            if time.perf_counter() - self.last_heard > CONNECTION_TIMEOUT:
+                break
+            time.sleep(0.005)
+
+    def run(self, frames=None):
+        while not self.game_over and (frames is None or self.frame < frames):
+            ran = self.tick()
+            if not HEADLESS:
+                self.game.steps_since_draw = int(ran)
+                self.game.render_alpha = 1.0  # a rollback leaves nothing sensible to interpolate from
+                self.game.draw_screen()
+                self.game.draw_debug()
+                self.game.dirty.update()
+                GL.CLOCK.tick(SIM_FPS)
+            elif not ran:
+                time.sleep(0.001)
+        self.finish()
+
+
+# ----------------------------------------------------------------------------
+def device_source():
+    """this machine's keyboard/gamepad, whichever player it ends up as"""
+    device = GL.INPUT1
+
+    def _source():
+        device.refresh()
+        return pack_input(device)
+    return _source
+
+
+def bot_source(seed):
+    rng = random.Random(seed)
+
+    def _source():
+        return rng.getrandbits(len(INPUT_FLAGS) - 1)  # everything but DROP_SKILL
+    return _source
+
+
+def host(port, source, arena_name='arena3'):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(('', port))
+    print('waiting for player 2 on port {}'.format(port))
+    data, addr = sock.recvfrom(4096)
+    while data[:1] != HELLO:
+        data, addr = sock.recvfrom(4096)
+    seed = random.randrange(2 ** 32)
+    start = START + struct.pack('<I', seed) + arena_name.encode()
+    sock.sendto(start, addr)
+    sock.setblocking(False)
+    print('player 2 joined from {}:{}'.format(*addr))
+    return _start_session(sock, addr, 1, source, seed, arena_name, start)
+
+
+def join(address, port, source):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(0.25)
+    remote_addr = (socket.gethostbyname(address), port)
+    while True:
+        sock.sendto(HELLO, remote_addr)
+        try:
+            data, addr = sock.recvfrom(4096)
+        except socket.timeout:
+            continue
+        if addr == remote_addr and data[:1] == START:
+            break
+    seed = struct.unpack_from('<I', data, 1)[0]
+    arena_name = data[5:].decode()
+    sock.setblocking(False)
+    print('joined {}:{} as player 2'.format(*remote_addr))
+    return _start_session(sock, remote_addr, 2, source, seed, arena_name)
+
+
+def _start_session(sock, addr, local_id, source, seed, arena_name, start_packet=None):
+    GL.SELECTED_ARENA = Arena(getattr(GL, arena_name))
+    GL.P1_SPRITESHEET = 'data/sprites+portraits/human_p1.png'
+    GL.P2_SPRITESHEET = 'data/sprites+portraits/elf_p2.png'
+    return RollbackSession(GameLoop(seed), sock, addr, local_id, source, start_packet)
+
+# ----------------------------------------------------------------------------
+
+if __name__ == '__main__':
+    args, options = [], {}
+    argv = iter(sys.argv[1:])
+    for a in argv:
+        if a == '--headless':
+            continue
+        if a.startswith('--'):
+            options[a] = next(argv)
+        else:
+            args.append(a)
+    frames = int(options['--frames']) if '--frames' in options else None
+    local_source = bot_source(int(options['--bot'])) if '--bot' in options else device_source()
+
+    if args[0] == 'host':
+        _session = host(int(args[1]), local_source)
+    else:
+        _host, _port = args[1].rsplit(':', 1)
+        _session = join(_host, int(_port), local_source)
+
+    _start = time.perf_counter()
+    _session.run(frames)
+    print('{} frames in {:.2f}s, {} rollbacks, digest {}{}'.format(
+        _session.frame, time.perf_counter() - _start, _session.rollbacks, _session.game.state_digest(),
+        '' if _session.desync_frame is None else ', DESYNC by frame {}'.format(_session.desync_frame)))
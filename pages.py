@@ -18,9 +18,9 @@ class StartPage:
         self.exit_button = PygButton((810, 395, 105, 40), 'Exit')
         if AUDIO.music_on:
             AUDIO.turn_on_music()
-        title_font = pygame.font.Font('data/fonts/Kremlin.ttf', 50)
-        self.title_font1 = title_font.render('Famished', True, DKRED)
-        self.title_font2 = title_font.render('Tournament', True, DKRED)
+        title_font = pygame.font.Font('data/fonts/kremlin.ttf', 50)
+        self.title_font1 = TEXT_CACHE.render(title_font, 'Famished', True, DKRED)
+        self.title_font2 = TEXT_CACHE.render(title_font, 'Tournament', True, DKRED)
         self.selection_box = Deque2([self.start_button, self.help_button, self.options_button, self.exit_button])
 
     def __call__(self):
@@ -120,17 +120,17 @@ class StartPage:
 class HelpPage:
     def __init__(self):
         self.return_button = PygButton((0, 550, 300, 50), 'Main Menu')
-        self.section_font = pygame.font.Font('data/fonts/Kremlin.ttf', 40)
+        self.section_font = pygame.font.Font('data/fonts/kremlin.ttf', 40)
         self.font = pygame.font.Font('data/fonts/arial_narrow_7.ttf', 20)
         self.bg_image = image_load('data/backgrounds/bg_help.png')
-        self.bg_title = self.section_font.render('Background', True, WHITE)
+        self.bg_title = TEXT_CACHE.render(self.section_font, 'Background', True, WHITE)
         self.bg_text = textwrap.wrap('Under the tyranny of the dark overlord, the world ' +
                                      'is in chaos and all the resources are nearly depleted.  ' +
                                      'Entire populations have been subjugated to life in labor ' +
                                      'camps, brutally policed by the overlord\'s military forces.  ' +
                                      'As your people\'s champion, you must fight to the death in the ' +
                                      'battle arena to win much needed resources.', width=50)
-        self.goals_title = self.section_font.render('Goals', True, WHITE)
+        self.goals_title = TEXT_CACHE.render(self.section_font, 'Goals', True, WHITE)
         self.goals_text = textwrap.wrap('Ultimately, you want to slay your opponent.  ' +
                                         'To become a better fighter, kill the monsters, gain ' +
                                         'experience, and pick up skills.  The player to land ' +
@@ -155,12 +155,12 @@ class HelpPage:
 
         GL.SCREEN.blit(self.bg_title, (800, 40))
         for num, text in enumerate(self.bg_text):
-            line = self.font.render(text, True, DKRED)
+            line = TEXT_CACHE.render(self.font, text, True, DKRED)
             GL.SCREEN.blit(line, (800, 90 + (num * 20)))
 
         GL.SCREEN.blit(self.goals_title, (800, 250))
         for num, text in enumerate(self.goals_text):
-            line = self.font.render(text, True, DKRED)
+            line = TEXT_CACHE.render(self.font, text, True, DKRED)
             GL.SCREEN.blit(line, (800, 300 + (num * 20)))
 
         self.return_button.draw(GL.SCREEN)
@@ -196,9 +196,9 @@ class PlayerSelectPage:
         self.portraits = Deque2([self.humanPortrait, self.elfPortrait])
         self.portraits2 = Deque2([self.humanPortrait, self.elfPortrait])
 
-        self.start_font = pygame.font.Font('data/fonts/Kremlin.ttf', 50)
+        self.start_font = pygame.font.Font('data/fonts/kremlin.ttf', 50)
         self.start_font_xy = font_position_center(GL.SCREEN.get_rect(), self.start_font, '---------------Press Start when ready---------------')
-        self.start_font_rendered = self.start_font.render('---------------Press Start when ready---------------', True, YELLOW)
+        self.start_font_rendered = TEXT_CACHE.render(self.start_font, '---------------Press Start when ready---------------', True, YELLOW)
 
         self.ready1 = False
 
@@ -418,9 +418,9 @@ class OptionsPage:
         self.music_off_button = PygButton((730, 200, 80, 50), 'OFF')
         self.sound_off_button = PygButton((730, 260, 80, 50), 'OFF')
 
-        font = pygame.font.Font('data/fonts/Kremlin.ttf', 40)
-        self.bg_font = font.render('Music:', True, DKRED)
-        self.se_font = font.render('Sound:', True, DKRED)
+        font = pygame.font.Font('data/fonts/kremlin.ttf', 40)
+        self.bg_font = TEXT_CACHE.render(font, 'Music:', True, DKRED)
+        self.se_font = TEXT_CACHE.render(font, 'Sound:', True, DKRED)
 
         self.selection_box = Deque2([
             Deque2([self.main_menu_button]),
@@ -551,10 +551,10 @@ class PausePage:
     def __init__(self):
         self.bg_image = image_load('data/backgrounds/bg_menus_dim.png')
         self.menu_box = Rect2(topleft=(320, 120), size=(640, 240), border_color=BLACK, fill_color=DGREY)
-        main_font = 'data/fonts/Kremlin.ttf'
+        main_font = 'data/fonts/kremlin.ttf'
         pause_font = pygame.font.Font(main_font, 100)
         self.pause_font_xy = font_position_center(self.menu_box, pause_font, '-PAUSE-')
-        self.pause_font_rendered = pause_font.render('-PAUSE-', True, RED)
+        self.pause_font_rendered = TEXT_CACHE.render(pause_font, '-PAUSE-', True, RED)
         self.continue_button = PygButton((395, 270, 200, 50), 'Continue')
         self.quit_button = PygButton((730, 270, 100, 50), 'Quit')
         self.selection_box = Deque2([self.continue_button, self.quit_button])
@@ -621,10 +621,10 @@ class GameOverPage:
     def __init__(self):
         self.bg_image = image_load('data/backgrounds/bg_menus_dim.png')
         self.menu_box = Rect2(topleft=(320, 120), size=(640, 240), border_color=BLACK, fill_color=DGREY)
-        main_font = 'data/fonts/Kremlin.ttf'
+        main_font = 'data/fonts/kremlin.ttf'
         game_over_font = pygame.font.Font(main_font, 95)
         self.game_over_xy = font_position_center(self.menu_box, game_over_font, '-Game Over-')
-        self.game_over_rendered = game_over_font.render('-Game Over-', True, RED)
+        self.game_over_rendered = TEXT_CACHE.render(game_over_font, '-Game Over-', True, RED)
         self.main_menu_button = PygButton((395, 270, 200, 50), 'Main Menu')
         self.exit_button = PygButton((730, 270, 100, 50), 'Exit')
         self.selection_box = Deque2([self.main_menu_button, self.exit_button])
@@ -39,7 +39,7 @@ or implied, of Al Sweigart.
 from globals import *
 
 pygame.font.init()
-PYGBUTTON_FONT = pygame.font.Font('data/fonts/Kremlin.ttf', 30)
+PYGBUTTON_FONT = pygame.font.Font('data/fonts/kremlin.ttf', 30)
 
 
 
@@ -212,7 +212,7 @@ class PygButton(object):
         self.surfaceHighlight.fill(self.bgcolor)
 
         # draw caption text for all buttons
-        captionSurf = self._font.render(self._caption, True, self.fgcolor, self.bgcolor)
+        captionSurf = TEXT_CACHE.render(self._font, self._caption, True, self.fgcolor, self.bgcolor)
         captionRect = captionSurf.get_rect()
         captionRect.center = int(w / 2), int(h / 2)
         self.surfaceNormal.blit(captionSurf, captionRect)
@@ -6,6 +6,11 @@ import classes
 SKILLS_TABLE = {}
 ICONS_TABLE = {}
 PARTICLES_TABLE = {}
+PARTICLE_SPECS = {}  # sid -> particle_spec_nt, filled in by particle_spec
+NAME_PLACEHOLDERS = {}  # (font, text, size) -> (surface, offset), filled in by name_placeholder
+HUD_ICON_SIZE = (40, 40)  # skill boxes
+GROUND_ICON_SIZE = (20, 20)  # dropped skills
+skill_icon_nt = namedtuple('skill_icon_nt', 'hud, ground')  # ICONS_TABLE entries, see icon_image
 
 # Skill ID guide:
 #     -1 : meditate
@@ -76,7 +81,14 @@ PARTICLES_TABLE = {}
 
 #   'on_terrain_f(current_particle)' : Additional effects it will do when the particle hits wall
 
+#   'special_path' : The other path. Takes in two parameters: the particle
+#   object, and time. Returns new x and y. Prefer one of the path kinds in
+#   classes (OffsetPath, VelocityPath, AcceleratingPath, LobPath, WavePath,
+#   OwnerPath) over a function; they save with the game and range particles
+#   on the same kind are moved together. Use a function for anything else.
+
 def initialize_skill_table():
+    PARTICLE_SPECS.clear()  # the lambdas below are new every time
     # -----------------------------------------------------------------------------------------
     # AUTO ATTACKS 1-99
     # -----------------------------------------------------------------------------------------
@@ -148,7 +160,7 @@ def initialize_skill_table():
     # Static Bolt
     SKILLS_TABLE[102] = _auto_range('Static Bolt', 50, 50, 5, 2, 500, 10000, BLUE, 10, 2, CAST1, 2, sound='data/sounds/static.wav')
     SKILLS_TABLE[102]['conditions'] = [classes.Weakened(5000)]
-    SKILLS_TABLE[102]['special_path'] = lightning_bolt_path
+    SKILLS_TABLE[102]['special_path'] = classes.WavePath(step=10, amplitude=10, wavelength=10, wave='cos')
     ICONS_TABLE[102] = icon_image('102.png')
     PARTICLES_TABLE[102] = particle_image('102.png')
 
@@ -319,6 +331,26 @@ def _auto_field(name, radius, cooldown, duration, color, dmg, energy, state='non
             'radius': radius, 'width': radius * 2, 'height': radius * 2, 'cooldown': cooldown, 'duration': duration,
             'color': color, 'dmg': dmg, 'energy': energy, 'state': state, 'frame': frame, 'subsprite': subsprite, 'sound': sound}
 
+# Particle specs ============================================
+particle_spec_nt = namedtuple('particle_spec_nt', 'width, height, cooldown, duration, color, dmg, energy, '
+                              'conditions, on_hit_f, on_expire_f, on_terrain_f, persistent_f, special_f, '
+                              'arc, start_radius, max_radius, extend, speed, acceleration, '
+                              'radius, persistent_pulse_f, frequency, category')
+
+
+def particle_spec(sid):
+    """everything a Particle takes from SKILLS_TABLE[sid], looked up once per
+    sid instead of on every spawn; None for whatever the skill leaves out"""
+    spec = PARTICLE_SPECS.get(sid)
+    if spec is None:
+        skill = SKILLS_TABLE[sid]
+        fields = {f: skill.get(f) for f in particle_spec_nt._fields}
+        fields['conditions'] = tuple(skill.get('conditions', ()))
+        fields['special_f'] = skill.get('special_path')
+        fields['category'] = skill.get('budget', PARTICLE_CATEGORIES.get(skill.get('type'), 'range'))
+        spec = PARTICLE_SPECS[sid] = particle_spec_nt(**fields)
+    return spec
+
 # Individual skills =========================================
 def blank_start(sid, player, up, down):
     return None
@@ -342,25 +374,6 @@ def teleport_start(sid, player, up, down):
     return None
 
 
-# Example of a special function
-# Takes in two parameters: the particle object, and time
-# Returns new x and y
-def lightning_bolt_path(particle, time):
-    x = particle.centerx
-    if particle.direction == RIGHT:
-        x += 10
-    else:
-        x -= 10
-    y = particle.originy + 10 * math.cos(x / 10)
-    return x, y
-
-def lob_motion(particle, time):
-    x = particle.centerx + particle.dx
-    particle.dy += particle.ddy
-    y = particle.centery + particle.dy
-    return x, y
-
-
 def ADD_BIG_HAMMER(i):
     SKILLS_TABLE[i] = _auto_melee('Big Hammer', 75, 75, math.pi / 2, 125, 125, 500, 500, DGREY, 20, 5, TWOHAND, 3, sound='data/sounds/hammer.wav')
     SKILLS_TABLE[i]['on_hit_f'] = knock_back
@@ -383,7 +396,7 @@ def ADD_BOULDER_TOSS(i):
     SKILLS_TABLE[i] = {'name': 'Boulder Toss', 'type': None, 'start': boulder_toss_start, 'cooldown': 200, 'energy': 6, 'state': THROW, 'frame': 2, 'sound': 'data/sounds/chicken-3.wav'}
     SKILLS_TABLE['boulder_toss'] = _auto_range('', 30, 30, 5, 0, 500, 3000, BLACK, 2, 0)
     SKILLS_TABLE['boulder_toss']['conditions'] = [classes.Stun(2000)]
-    SKILLS_TABLE['boulder_toss']['special_path'] = lob_motion
+    SKILLS_TABLE['boulder_toss']['special_path'] = classes.LobPath()
     PARTICLES_TABLE['boulder_toss'] = particle_image('boulder_toss.png')
 def boulder_toss_start(sid, player, up=False, down=False):
     obj = classes.RangeParticle('boulder_toss', player, up, down)
@@ -400,27 +413,29 @@ def ADD_SHRAPNEL_BOMB(i):
     SKILLS_TABLE[i] = {'name': 'Shrapnel Bomb', 'type': None, 'start': shrapnel_bomb_start, 'cooldown': 200, 'energy': 2, 'state': THROW, 'frame': 1, 'sound': 'data/sounds/shrap.wav'}
     SKILLS_TABLE['shrapnel_base'] = _auto_range('', 25, 25, 5, 0, 200, 3000, DGREY, 10, 0)
     PARTICLES_TABLE['shrapnel_base'] = particle_image('shrapnel_base.png')
-    SKILLS_TABLE['shrapnel_base']['special_path'] = lob_motion
+    SKILLS_TABLE['shrapnel_base']['special_path'] = classes.LobPath()
     SKILLS_TABLE['shrapnel_base']['on_hit_f'] = shrapnel_on_hit
     SKILLS_TABLE['shrapnel_base']['on_expire_f'] = shrapnel_on_expire
     SKILLS_TABLE['shrapnel_base']['on_terrain_f'] = shrapnel_on_terrain
     SKILLS_TABLE['shrapnel_trigger'] = {'name': '', 'type': None, 'start': shrapnel_trigger_start, 'cooldown': 100, 'energy': 0, 'state': THROW, 'frame': 1, 'sound': 'data/sounds/shrap2.wav'}
     SKILLS_TABLE['shrapnel0'] = _auto_range('', 10, 10, 2, 0, 500, 1000, DGREY, 5, 0)
-    SKILLS_TABLE['shrapnel0']['special_path'] = (lambda p, t: (p.centerx + 10, p.centery))
+    SKILLS_TABLE['shrapnel0']['special_path'] = classes.OffsetPath(10, 0)
     SKILLS_TABLE['shrapnel1'] = _auto_range('', 10, 10, 2, 0, 500, 1000, DGREY, 5, 0)
-    SKILLS_TABLE['shrapnel1']['special_path'] = (lambda p, t: (p.centerx - 10, p.centery))
+    SKILLS_TABLE['shrapnel1']['special_path'] = classes.OffsetPath(-10, 0)
     SKILLS_TABLE['shrapnel2'] = _auto_range('', 10, 10, 2, 0, 500, 1000, DGREY, 5, 0)
-    SKILLS_TABLE['shrapnel2']['special_path'] = (lambda p, t: (p.centerx, p.centery + 10))
+    SKILLS_TABLE['shrapnel2']['special_path'] = classes.OffsetPath(0, 10)
     SKILLS_TABLE['shrapnel3'] = _auto_range('', 10, 10, 2, 0, 500, 1000, DGREY, 5, 0)
-    SKILLS_TABLE['shrapnel3']['special_path'] = (lambda p, t: (p.centerx, p.centery - 10))
+    SKILLS_TABLE['shrapnel3']['special_path'] = classes.OffsetPath(0, -10)
     SKILLS_TABLE['shrapnel4'] = _auto_range('', 10, 10, 2, 0, 500, 1000, DGREY, 5, 0)
     SKILLS_TABLE['shrapnel5'] = _auto_range('', 10, 10, 2, 0, 500, 1000, DGREY, 5, 0)
     SKILLS_TABLE['shrapnel6'] = _auto_range('', 10, 10, 2, 0, 500, 1000, DGREY, 5, 0)
     SKILLS_TABLE['shrapnel7'] = _auto_range('', 10, 10, 2, 0, 500, 1000, DGREY, 5, 0)
-    SKILLS_TABLE['shrapnel4']['special_path'] = (lambda p, t: (p.centerx + 10, p.centery + 10))
-    SKILLS_TABLE['shrapnel5']['special_path'] = (lambda p, t: (p.centerx + 10, p.centery - 10))
-    SKILLS_TABLE['shrapnel6']['special_path'] = (lambda p, t: (p.centerx - 10, p.centery + 10))
-    SKILLS_TABLE['shrapnel7']['special_path'] = (lambda p, t: (p.centerx - 10, p.centery - 10))
+    SKILLS_TABLE['shrapnel4']['special_path'] = classes.OffsetPath(10, 10)
+    SKILLS_TABLE['shrapnel5']['special_path'] = classes.OffsetPath(10, -10)
+    SKILLS_TABLE['shrapnel6']['special_path'] = classes.OffsetPath(-10, 10)
+    SKILLS_TABLE['shrapnel7']['special_path'] = classes.OffsetPath(-10, -10)
+    for n in range(8):
+        SKILLS_TABLE['shrapnel{}'.format(n)]['budget'] = 'swarm'
 def shrapnel_bomb_start(sid, player, up=False, down=False):
     if player.skill1_id == 105:
         player.skill1_id = 'shrapnel_trigger'
@@ -435,7 +450,7 @@ def shrapnel_bomb_start(sid, player, up=False, down=False):
     else:
         obj.dx = -10
     obj.ddy = 1
-    player.temp_shrapnel = obj
+    player.temp_shrapnel = classes.ParticleSlots.handle(obj)  # obj may be released and reused
     return obj
 def shrapnel_trigger_start(sid, player, up=False, down=False):
     if player.skill1_id == 'shrapnel_trigger':
@@ -445,9 +460,9 @@ def shrapnel_trigger_start(sid, player, up=False, down=False):
     elif player.skill3_id == 'shrapnel_trigger':
         player.skill3_id = 105
 
-    obj = player.__dict__['temp_shrapnel']
+    obj = classes.ParticleSlots.get(player.__dict__['temp_shrapnel'])
     del player.__dict__['temp_shrapnel']
-    if not obj.expired:
+    if obj is not None and not obj.expired:
         x = obj.centerx
         y = obj.centery
         obj.expired = True
@@ -512,13 +527,14 @@ def ADD_NAPALM(i):
     SKILLS_TABLE['napalm0'] = _auto_range('', 20, 20, 2, 0, 500, 3000, RED, 10, 0)
     SKILLS_TABLE['napalm1'] = _auto_range('', 20, 20, 2, 0, 500, 3000, RED, 10, 0)
     SKILLS_TABLE['napalm2'] = _auto_range('', 20, 20, 2, 0, 500, 3000, RED, 10, 0)
-    SKILLS_TABLE['napalm_main']['special_path'] = lob_motion
+    SKILLS_TABLE['napalm_main']['special_path'] = classes.LobPath()
     SKILLS_TABLE['napalm_main']['conditions'] = [classes.Dot(3, 5, 1000)]
     SKILLS_TABLE['napalm_main']['on_expire_f'] = napalm_on_expire
-    SKILLS_TABLE['napalm0']['special_path'] = lob_motion
-    SKILLS_TABLE['napalm1']['special_path'] = lob_motion
-    SKILLS_TABLE['napalm0']['special_path'] = lob_motion
-    SKILLS_TABLE['napalm1']['special_path'] = lob_motion
+    SKILLS_TABLE['napalm0']['special_path'] = classes.LobPath()
+    SKILLS_TABLE['napalm1']['special_path'] = classes.LobPath()
+    SKILLS_TABLE['napalm0']['special_path'] = classes.LobPath()
+    SKILLS_TABLE['napalm1']['special_path'] = classes.LobPath()
+    SKILLS_TABLE['napalm0']['budget'] = SKILLS_TABLE['napalm1']['budget'] = 'swarm'
     PARTICLES_TABLE['napalm_main'] = particle_image('napalm_main.png')
     PARTICLES_TABLE['napalm0'] = particle_image('napalm_part.png')
     PARTICLES_TABLE['napalm1'] = particle_image('napalm_part.png')
@@ -553,24 +569,16 @@ def napalm_on_expire(p):
         obj1.dx = -8
         obj2.dx = -12
     obj0.ddy = obj1.ddy = obj2.ddy = 1
-    if p.belongs_to.new_particle is None:
-        p.belongs_to.new_particle = [obj0, obj1, obj2]
-    elif isinstance(p.belongs_to.new_particle, list):
-        p.belongs_to.new_particle.append(obj0)
-        p.belongs_to.new_particle.append(obj1)
-        p.belongs_to.new_particle.append(obj2)
-    else:
-        temp = p.belongs_to.new_particle
-        p.belongs_to.new_particle = [temp, obj0, obj1, obj2]
+    p.belongs_to.spawns.add([obj0, obj1, obj2])
 
 
 def ADD_FIRE_AND_ICE(i):
     SKILLS_TABLE[i] = {'name': 'Icy-Hot', 'type': None, 'start': fai_start, 'cooldown': 200, 'energy': 5, 'state': CAST1, 'frame': 1, 'sound': 'data/sounds/fireice.wav'}
     SKILLS_TABLE['fai_fire'] = _auto_range('', 20, 20, 5, 2, 500, 10000, RED, 10, 2)
-    SKILLS_TABLE['fai_fire']['special_path'] = fai_fire_path
+    SKILLS_TABLE['fai_fire']['special_path'] = classes.WavePath(step=10, amplitude=20, wavelength=50, wave='cos')
     SKILLS_TABLE['fai_fire']['conditions'] = [classes.Dot(5, 3, 1000)]
     SKILLS_TABLE['fai_ice'] = _auto_range('', 20, 20, 5, 2, 500, 10000, LBLUE, 10, 2)
-    SKILLS_TABLE['fai_ice']['special_path'] = fai_ice_path
+    SKILLS_TABLE['fai_ice']['special_path'] = classes.WavePath(step=10, amplitude=20, wavelength=50, wave='sin')
     SKILLS_TABLE['fai_ice']['conditions'] = [classes.Snare(2500)]
     PARTICLES_TABLE['fai_fire'] = particle_image('fai_fire.png')
     PARTICLES_TABLE['fai_ice'] = particle_image('fai_ice.png')
@@ -578,22 +586,6 @@ def fai_start(sid, player, up=False, down=False):
     ice = classes.RangeParticle('fai_ice', player, up, down)
     fire = classes.RangeParticle('fai_fire', player, up, down)
     return [ice, fire]
-def fai_fire_path(particle, time):
-    x = particle.centerx
-    if particle.direction == RIGHT:
-        x += 10
-    else:
-        x -= 10
-    y = particle.originy + 20 * math.cos(x / 50)
-    return x, y
-def fai_ice_path(particle, time):
-    x = particle.centerx
-    if particle.direction == RIGHT:
-        x += 10
-    else:
-        x -= 10
-    y = particle.originy + 20 * math.sin(x / 50)
-    return x, y
 
 
 def ADD_VILE_BREATH(i):
@@ -707,14 +699,16 @@ def ADD_BEE_HIVE(i):
     SKILLS_TABLE['bee7'] = _auto_range('', 10, 10, 5, 0, 100, 500, YELLOW, 5, 0)
     SKILLS_TABLE['bee8'] = _auto_range('', 10, 10, 5, 0, 100, 500, YELLOW, 5, 0)
 
-    SKILLS_TABLE['bee1']['special_path'] = (lambda p, t: (p.centerx - 10, p.centery - 10))
-    SKILLS_TABLE['bee2']['special_path'] = (lambda p, t: (p.centerx, p.centery - 10))
-    SKILLS_TABLE['bee3']['special_path'] = (lambda p, t: (p.centerx + 10, p.centery - 10))
-    SKILLS_TABLE['bee4']['special_path'] = (lambda p, t: (p.centerx + 10, p.centery))
-    SKILLS_TABLE['bee5']['special_path'] = (lambda p, t: (p.centerx + 10, p.centery + 10))
-    SKILLS_TABLE['bee6']['special_path'] = (lambda p, t: (p.centerx, p.centery + 10))
-    SKILLS_TABLE['bee7']['special_path'] = (lambda p, t: (p.centerx - 10, p.centery + 10))
-    SKILLS_TABLE['bee8']['special_path'] = (lambda p, t: (p.centerx - 10, p.centery))
+    SKILLS_TABLE['bee1']['special_path'] = classes.OffsetPath(-10, -10)
+    SKILLS_TABLE['bee2']['special_path'] = classes.OffsetPath(0, -10)
+    SKILLS_TABLE['bee3']['special_path'] = classes.OffsetPath(10, -10)
+    SKILLS_TABLE['bee4']['special_path'] = classes.OffsetPath(10, 0)
+    SKILLS_TABLE['bee5']['special_path'] = classes.OffsetPath(10, 10)
+    SKILLS_TABLE['bee6']['special_path'] = classes.OffsetPath(0, 10)
+    SKILLS_TABLE['bee7']['special_path'] = classes.OffsetPath(-10, 10)
+    SKILLS_TABLE['bee8']['special_path'] = classes.OffsetPath(-10, 0)
+    for n in range(1, 9):
+        SKILLS_TABLE['bee{}'.format(n)]['budget'] = 'swarm'
 
     PARTICLES_TABLE['beehive'] = particle_image('beehive.png')
     PARTICLES_TABLE['bee1'] = particle_image('bee.png')
@@ -749,13 +743,7 @@ def bee_hive_path(particle, time):
             li[i].centerx = particle.centerx
             li[i].centery = particle.centery
 
-        if particle.belongs_to.new_particle is None:
-            particle.belongs_to.new_particle = li
-        elif isinstance(particle.belongs_to.new_particle, list):
-            particle.belongs_to.new_particle += li
-        else:
-            temp = particle.belongs_to.new_particle
-            particle.belongs_to.new_particle = [temp] + li
+        particle.belongs_to.spawns.add(li)
 
     return particle.centerx + particle.dx, particle.centery
 
@@ -765,7 +753,7 @@ def ADD_SKILL_PERSONAL_FAERIE(i):
     SKILLS_TABLE['personal_faerie']['special_path'] = faerie_path
     PARTICLES_TABLE['personal_faerie'] = particle_image('personal_faerie.png')
     SKILLS_TABLE['faerie_shoot'] = _auto_range('', 10, 10, 5, 0.5, 100, 1000, BLUE, 4, 0)
-    SKILLS_TABLE['faerie_shoot']['special_path'] = faerie_shot_path
+    SKILLS_TABLE['faerie_shoot']['special_path'] = classes.AcceleratingPath()
     PARTICLES_TABLE['faerie_shoot'] = particle_image('faerie_shot.png')
 def personal_faerie_start(sid, player, up=False, down=False):
     obj = classes.MeleeParticle('personal_faerie', player)
@@ -792,7 +780,7 @@ def faerie_path(p, t):
         if shot.direction == LEFT:
             shot.dx *= -1
             shot.ddx *= -1
-        force_add_particle_to_player(shot, p.belongs_to)
+        p.belongs_to.spawns.add(shot)
 
     y = p.belongs_to.centery - 20
     if p.direction == RIGHT:
@@ -800,11 +788,6 @@ def faerie_path(p, t):
     else:
         x = p.belongs_to.centerx - 15
     return x, y
-def faerie_shot_path(p, t):
-    y = p.centery
-    x = p.centerx + p.dx
-    p.dx += p.ddx
-    return x, y
 
 def ADD_EPICENTER(i):
     SKILLS_TABLE[i] = {'name': 'Epicenter', 'type': None, 'start': epicenter_start, 'cooldown': 300, 'energy': 8, 'state': CAST3, 'frame': 2, 'sound': 'data/sounds/epicenter.wav'}
@@ -897,7 +880,7 @@ def vampiric_swipe_on_hit(particle, target, time):
 def ADD_BLAST_OFF(i):
     SKILLS_TABLE[i] = {'name': 'Blast Off', 'type': None, 'start': blast_off_start, 'cooldown': 250, 'energy': 2, 'state': DASH, 'frame': 1, 'sound': 'none'}
     SKILLS_TABLE['blast_off'] = _auto_melee('', 70, 80, 0, 0, 0, 250, 250, RED, 5, 0)
-    SKILLS_TABLE['blast_off']['special_path'] = blast_off_path
+    SKILLS_TABLE['blast_off']['special_path'] = classes.OwnerPath(25, 30)
     SKILLS_TABLE['blast_off']['conditions'] = [classes.Dot(2, 3, 1000)]
     PARTICLES_TABLE['blast_off'] = particle_image('blast_off.png')
 def blast_off_start(sid, player, up, down):
@@ -921,10 +904,6 @@ def blast_off_start(sid, player, up, down):
                 player.dy -= 8
 
     return classes.MeleeParticle('blast_off', player)
-def blast_off_path(particle, time):
-    x = particle.belongs_to.left + 25
-    y = particle.belongs_to.top + 30
-    return x, y
 
 def ADD_FALCON_PUNCH(i):
     SKILLS_TABLE[i] = {'name': 'Falcon Punch', 'type': None, 'start': falcon_punch_start, 'cooldown': 1500, 'energy': 0, 'state': ONEHAND, 'frame': 1, 'sound': 'none'}
@@ -999,7 +978,7 @@ def barrage_primary_on_hit(particle, target, time):
     b2.centery = b2.belongs_to.centery
     b3.centerx = b3.belongs_to.centerx
 
-    force_add_particle_to_player([b1, b2, b3], particle.belongs_to)
+    particle.belongs_to.spawns.add([b1, b2, b3])
 def barrage_path(particle, time):
     dx = 0
     dy = 0
@@ -1024,7 +1003,7 @@ def barrage_on_hit_f(particle, target, time):
 def ADD_SHOTGUN(i):
     SKILLS_TABLE[i] = {'name': 'Shotgun', 'start': shotgun_start, 'cooldown': 500, 'energy': 0, 'state': MACHGUN, 'frame': 4, 'sound': 'none'}
     SKILLS_TABLE['shotgun_pellet'] = _auto_range('', 10, 10, 20, 1, 250, 500, ORANGE, 2, 0)
-    SKILLS_TABLE['shotgun_pellet']['special_path'] = shotgun_pellet_path
+    SKILLS_TABLE['shotgun_pellet']['special_path'] = classes.VelocityPath()
 def shotgun_start(sid, player, up=False, down=False):
     plist = []
     for i in range(0, 5):
@@ -1041,8 +1020,6 @@ def shotgun_start(sid, player, up=False, down=False):
         plist.append(p)
     return plist
 
-def shotgun_pellet_path(particle, time):
-    return particle.centerx + particle.dx, particle.centery + particle.dy
 # ----------------------------------------------------------------------------
 def get_dropped_skill(monster):
     if monster.kind == WEAK:
@@ -1070,10 +1047,22 @@ def ultimate_skills():
     return list(filter(lambda x: type(x) is int and x >= 1000, SKILLS_TABLE.keys()))
 
 def icon_image(fname):
+    """an ICONS_TABLE entry: the icon scaled once for each place it is drawn"""
     a = image_load(os.path.join('data', 'icons', fname)).convert()
     a.set_colorkey(TRANSPARENT)
     a = a.convert_alpha()
-    return a
+    hud = a if a.get_size() == HUD_ICON_SIZE else image_scale(a, HUD_ICON_SIZE)
+    return skill_icon_nt(hud, image_scale(a, GROUND_ICON_SIZE))
+
+def name_placeholder(font, text, size):
+    """for a skill without an icon: text rendered in font, and where to put
+    it to center it on a rect of this size"""
+    placeholder = NAME_PLACEHOLDERS.get((font, text, size))
+    if placeholder is None:
+        w, h = font.size(text)
+        placeholder = NAME_PLACEHOLDERS[font, text, size] = (
+            TEXT_CACHE.render(font, text, True, WHITE), ((size[0] - w) // 2, (size[1] - h) // 2))
+    return placeholder
 
 def particle_image(fname):
     a = image_load(os.path.join('data', 'particles', fname)).convert()